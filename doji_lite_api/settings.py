@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 import os
 import re
+import json
 import dj_database_url
 
 if os.path.exists('env.py'):
@@ -63,6 +64,74 @@ JWT_AUTH_SAMESITE = 'None'
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 FMP_API_KEY = os.getenv('FMP_API_KEY')
+FMP_BASE_URL = os.getenv('FMP_BASE_URL', 'https://financialmodelingprep.com/api/v3')
+
+# Where quotes come from: 'fmp', 'replay' to play back the PRICE_TAPE_PATH
+# tick file without the network, or 'local' for the FMP-shaped stand-in
+# served by the serve_price_tape command at LOCAL_QUOTE_SERVER_URL
+PRICE_SOURCE = os.getenv('PRICE_SOURCE', 'fmp')
+PRICE_TAPE_PATH = os.getenv('PRICE_TAPE_PATH')
+LOCAL_QUOTE_SERVER_URL = os.getenv('LOCAL_QUOTE_SERVER_URL', 'http://127.0.0.1:8765')
+
+# Batched quote requests carry at most this many symbols, and stay under
+# this many characters of symbol list so the URL is safe for any proxy
+FMP_QUOTE_BATCH_SIZE = int(os.getenv('FMP_QUOTE_BATCH_SIZE', 100))
+FMP_QUOTE_MAX_URL_SYMBOLS_LENGTH = int(os.getenv('FMP_QUOTE_MAX_URL_SYMBOLS_LENGTH', 1500))
+# Quote requests that need several chunks send this many at once
+FMP_QUOTE_CONCURRENCY = int(os.getenv('FMP_QUOTE_CONCURRENCY', 4))
+# Quote requests share a keep-alive pool per process. Connection errors,
+# timeouts and 429/5xx responses are retried FMP_MAX_RETRIES times with
+# jittered backoff starting at FMP_RETRY_BACKOFF seconds, and after
+# FMP_CIRCUIT_FAILURE_THRESHOLD failed calls in a row the provider isn't
+# called again for FMP_CIRCUIT_RESET_TIMEOUT seconds
+FMP_CONNECT_TIMEOUT = float(os.getenv('FMP_CONNECT_TIMEOUT', 3.05))
+FMP_READ_TIMEOUT = float(os.getenv('FMP_READ_TIMEOUT', 10))
+FMP_POOL_SIZE = int(os.getenv('FMP_POOL_SIZE', 10))
+FMP_MAX_RETRIES = int(os.getenv('FMP_MAX_RETRIES', 2))
+FMP_RETRY_BACKOFF = float(os.getenv('FMP_RETRY_BACKOFF', 0.25))
+FMP_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('FMP_CIRCUIT_FAILURE_THRESHOLD', 5))
+FMP_CIRCUIT_RESET_TIMEOUT = int(os.getenv('FMP_CIRCUIT_RESET_TIMEOUT', 30))
+
+# Quotes are cached for QUOTE_CACHE_TTL seconds, or the symbol's entry in
+# QUOTE_CACHE_SYMBOL_TTLS (a JSON object), then served stale for up to
+# QUOTE_CACHE_STALE_TTL more while a background refresh runs. Symbols
+# the provider has no quote for are not asked again for QUOTE_CACHE_NEGATIVE_TTL
+QUOTE_CACHE_ALIAS = 'quotes'
+QUOTE_CACHE_TTL = int(os.getenv('QUOTE_CACHE_TTL', 15))
+QUOTE_CACHE_SYMBOL_TTLS = json.loads(os.getenv('QUOTE_CACHE_SYMBOL_TTLS', '{}'))
+QUOTE_CACHE_STALE_TTL = int(os.getenv('QUOTE_CACHE_STALE_TTL', 300))
+QUOTE_CACHE_NEGATIVE_TTL = int(os.getenv('QUOTE_CACHE_NEGATIVE_TTL', 60))
+# While the provider is down, quotes fall back to the last price seen
+# this many seconds ago or less
+QUOTE_CACHE_LAST_KNOWN_TTL = int(os.getenv('QUOTE_CACHE_LAST_KNOWN_TTL', 86400))
+QUOTE_CACHE_REFRESH_ASYNC = os.getenv('QUOTE_CACHE_REFRESH_ASYNC', 'True') == 'True'
+# One worker at a time fetches a missed symbol, holding a cache lease on it
+# for up to QUOTE_CACHE_LEASE_TTL seconds; the others wait at most that long
+QUOTE_CACHE_LEASE_TTL = int(os.getenv('QUOTE_CACHE_LEASE_TTL', 10))
+# Workers add their hit and miss counts to the shared ones this often
+QUOTE_CACHE_STATS_FLUSH_INTERVAL = int(os.getenv('QUOTE_CACHE_STATS_FLUSH_INTERVAL', 30))
+
+# Seconds a worker keeps its copy of the symbol registry before re-reading it
+SYMBOL_REGISTRY_TTL = int(os.getenv('SYMBOL_REGISTRY_TTL', 60))
+
+# CSV uploads are read and committed this many rows at a time
+UPLOAD_CSV_CHUNK_SIZE = int(os.getenv('UPLOAD_CSV_CHUNK_SIZE', 5000))
+UPLOAD_CSV_BULK_BATCH_SIZE = int(os.getenv('UPLOAD_CSV_BULK_BATCH_SIZE', 1000))
+# Rows this close to the owner's newest synced trade for their symbol are always re-checked
+UPLOAD_WATERMARK_OVERLAP_HOURS = int(os.getenv('UPLOAD_WATERMARK_OVERLAP_HOURS', 24))
+
+# Uploads run as background jobs on a per-process thread pool
+UPLOAD_JOBS_ASYNC = os.getenv('UPLOAD_JOBS_ASYNC', 'True') == 'True'
+UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', 2))
+# Jobs whose worker reported no progress for this many seconds, or still
+# queued this long, lost their worker, e.g. to a restart, and are marked failed
+UPLOAD_JOB_STALE_SECONDS = int(os.getenv('UPLOAD_JOB_STALE_SECONDS', 3600))
+
+# Seconds between live price refreshes by the poll_live_prices worker
+LIVE_PRICE_POLL_INTERVAL = int(os.getenv('LIVE_PRICE_POLL_INTERVAL', 15))
+
+# Processes used to match assets in parallel; 1 matches inline
+MATCHING_PARALLELISM = int(os.getenv('MATCHING_PARALLELISM', 1))
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = 'DEV' in os.environ
@@ -177,6 +246,17 @@ else:
     }
     print("connected")
 
+# Quotes are shared by every worker, so they live in the database by
+# default (run createcachetable); a file based cache works locally too
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'quotes': {
+        'BACKEND': os.getenv('QUOTE_CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.getenv('QUOTE_CACHE_LOCATION', 'quote_cache'),
+    },
+}
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
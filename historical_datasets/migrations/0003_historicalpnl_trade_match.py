@@ -0,0 +1,20 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0012_tradeuploadblofin_live_trade'),
+        ('historical_datasets', '0002_alter_historicalpnl_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalpnl',
+            name='trade_match',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='historical_pnl', to='upload_csv.tradematch'),
+        ),
+    ]
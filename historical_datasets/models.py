@@ -7,6 +7,10 @@ class HistoricalPnl(models.Model):
     date = models.DateTimeField()
     symbol = models.CharField(max_length=25)
     pnl = models.DecimalField(max_digits=10, decimal_places=2)
+    # Ledger match the row was emitted from, so a rematch replaces it
+    trade_match = models.OneToOneField(
+        'upload_csv.TradeMatch', on_delete=models.CASCADE, null=True, blank=True,
+        related_name='historical_pnl')
 
     class Meta:
         ordering = ['date']
@@ -0,0 +1,37 @@
+from decimal import Decimal
+from django.conf import settings
+from pnls.profit_refresh import deferred_realized_profit_refresh, schedule_realized_profit_refresh
+from upload_csv.models import TradeMatch
+from .models import HistoricalPnl
+
+
+def emit_historical_pnl(user_ids):
+    """
+    Create a HistoricalPnl row for every ledger match that has none yet.
+
+    Rows are inserted with bulk_create, which sends no post_save, so each
+    user's RealizedProfit is refreshed once when the transaction commits.
+    Returns the number of rows created.
+    """
+    matches = TradeMatch.objects.filter(
+        owner_id__in=user_ids, historical_pnl__isnull=True
+    ).values_list('id', 'owner_id', 'closed_at', 'asset', 'realized_pnl')
+
+    rows = [
+        HistoricalPnl(
+            trade_match_id=match_id,
+            user_id=owner_id,
+            date=closed_at,
+            symbol=asset,
+            pnl=realized_pnl.quantize(Decimal('0.01')),
+        )
+        for match_id, owner_id, closed_at, asset, realized_pnl in matches.iterator()
+    ]
+
+    with deferred_realized_profit_refresh():
+        HistoricalPnl.objects.bulk_create(rows, batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE)
+        # Rematches can also drop rows, so every user is refreshed
+        for user_id in user_ids:
+            schedule_realized_profit_refresh(user_id)
+
+    return len(rows)
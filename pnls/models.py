@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from decimal import Decimal
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum
+from django.db.models import Sum, Q
 from django.apps import apps
 
 class YearlyProfit(models.Model):
@@ -27,60 +27,12 @@ class RealizedProfit(models.Model):
     yearly_profit = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True) 
 
-    def calculate_total_pnl(self):
-        # Use the get_model method to avoid circular imports
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        total_pnl = HistoricalPnl.objects.filter(user=self.user).aggregate(models.Sum('pnl'))['pnl__sum']
-        return total_pnl if total_pnl is not None else Decimal('0.00')
-
-    def calculate_today_pnl(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        today = timezone.now()
-        today_pnl = HistoricalPnl.objects.filter(user=self.user, date__date=today).aggregate(models.Sum('pnl'))['pnl__sum']
-        return today_pnl if today_pnl is not None else Decimal('0.00')
-
-    def calculate_yesterday_total_pnl(self):
-        
-        # Get the HistoricalPnl model from the historical_datasets app
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        
-        # Get the current time
-        now = timezone.now()
-        
-        # Calculate the start and end of yesterday
-        start_of_yesterday = now - timedelta(days=1)
-        end_of_yesterday = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
-        
-        # Adjust the start of yesterday to the beginning of the day
-        start_of_yesterday = start_of_yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-        # Filter records for the previous day
-        yesterday_total_pnl = HistoricalPnl.objects.filter(
-            user=self.user,
-            date__range=[start_of_yesterday, end_of_yesterday]
-        ).aggregate(models.Sum('pnl'))['pnl__sum']
-        
-        # Return the result or 0 if no records are found
-        return yesterday_total_pnl if yesterday_total_pnl is not None else Decimal('0.00')
-
-    def calculate_yesterday_pnl(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        yesterday = timezone.now() - timezone.timedelta(days=1)
-        yesterday_pnl = HistoricalPnl.objects.filter(user=self.user, date__date=yesterday).aggregate(models.Sum('pnl'))['pnl__sum']
-        return yesterday_pnl if yesterday_pnl is not None else Decimal('0.00')
-
     def calculate_daily_percentage_change(self):
         
         """Calculate the percentage change in profit and loss (PnL) from yesterday to today."""
-        # Calculate yesterday's total PnL
-        calculated_yesterday_total_pnl = self.calculate_yesterday_total_pnl()
-
         # Calculate yesterday's total PnL if it's zero
         if self.yesterday_total_pnl == Decimal('0.00'):
-            self.yesterday_total_pnl = self.calculate_total_pnl() - self.today_pnl
+            self.yesterday_total_pnl = self.total_pnl - self.today_pnl
 
         # Check if it's the first entry or if both total_pnl and yesterday_total_pnl are zero
         if self.total_pnl == Decimal('0.00') and self.yesterday_total_pnl == Decimal('0.00'):
@@ -92,50 +44,33 @@ class RealizedProfit(models.Model):
             return change.quantize(Decimal('0.00'))  # Ensure decimal precision
         return Decimal('0.00')
 
-
-    def calculate_last_30_day_profit(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        today = timezone.now()
-        last_30_day_pnl = HistoricalPnl.objects.filter(user=self.user, date__gte=today - timezone.timedelta(days=30)).aggregate(models.Sum('pnl'))['pnl__sum']
-        return last_30_day_pnl if last_30_day_pnl is not None else Decimal('0.00')
-
-    def calculate_last_90_day_profit(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        today = timezone.now()
-        last_90_day_pnl = HistoricalPnl.objects.filter(user=self.user, date__gte=today - timezone.timedelta(days=90)).aggregate(models.Sum('pnl'))['pnl__sum']
-        return last_90_day_pnl if last_90_day_pnl is not None else Decimal('0.00')
-
-    def calculate_last_180_day_profit(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        today = timezone.now()
-        last_180_day_pnl = HistoricalPnl.objects.filter(user=self.user, date__gte=today - timezone.timedelta(days=180)).aggregate(models.Sum('pnl'))['pnl__sum']
-        return last_180_day_pnl if last_180_day_pnl is not None else Decimal('0.00')
-
-    def calculate_yearly_profit(self):
-        
-        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
-        current_year = timezone.now().year
-        yearly_pnl = HistoricalPnl.objects.filter(user=self.user, date__year=current_year).aggregate(models.Sum('pnl'))['pnl__sum']
-        return yearly_pnl if yearly_pnl is not None else Decimal('0.00')
-
     def save(self, *args, **kwargs):
         # Ensure all values are updated before saving
         self.update_realized_profit()
         super().save(*args, **kwargs)
 
     def update_realized_profit(self):
-        self.total_pnl = self.calculate_total_pnl()
-        self.today_pnl = self.calculate_today_pnl()
-        self.yesterday_total_pnl = self.calculate_yesterday_total_pnl()
-        self.yesterday_pnl = self.calculate_yesterday_pnl()
+        # Every window comes from one aggregate query
+        HistoricalPnl = apps.get_model('historical_datasets', 'HistoricalPnl')
+        now = timezone.now()
+        yesterday = now - timedelta(days=1)
+        start_of_yesterday = yesterday.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_of_yesterday = now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
+
+        sums = HistoricalPnl.objects.filter(user_id=self.user_id).aggregate(
+            total_pnl=Sum('pnl'),
+            today_pnl=Sum('pnl', filter=Q(date__date=now)),
+            yesterday_total_pnl=Sum('pnl', filter=Q(date__range=[start_of_yesterday, end_of_yesterday])),
+            yesterday_pnl=Sum('pnl', filter=Q(date__date=yesterday)),
+            last_30_day_profit=Sum('pnl', filter=Q(date__gte=now - timedelta(days=30))),
+            last_90_day_profit=Sum('pnl', filter=Q(date__gte=now - timedelta(days=90))),
+            last_180_day_profit=Sum('pnl', filter=Q(date__gte=now - timedelta(days=180))),
+            yearly_profit=Sum('pnl', filter=Q(date__year=now.year)),
+        )
+        for field, value in sums.items():
+            setattr(self, field, value if value is not None else Decimal('0.00'))
+
         self.daily_percentage_change = self.calculate_daily_percentage_change()
-        self.last_30_day_profit = self.calculate_last_30_day_profit()
-        self.last_90_day_profit = self.calculate_last_90_day_profit()
-        self.last_180_day_profit = self.calculate_last_180_day_profit()
-        self.yearly_profit = self.calculate_yearly_profit()
         self.updated_at = timezone.now()  # Ensure updated_at is set to the current time
 
     def __str__(self):
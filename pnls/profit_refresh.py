@@ -0,0 +1,48 @@
+from contextlib import contextmanager
+from functools import partial
+from django.db import transaction
+from .models import RealizedProfit
+import threading
+
+_deferred = threading.local()
+
+
+def refresh_realized_profit(user_id):
+    """Recompute a user's RealizedProfit from their HistoricalPnl rows."""
+    realized_profit, created = RealizedProfit.objects.get_or_create(user_id=user_id)
+    if not created:
+        # save() recomputes every total
+        realized_profit.save()
+    return realized_profit
+
+
+def schedule_realized_profit_refresh(user_id):
+    """
+    Recompute a user's RealizedProfit once the current transaction commits.
+
+    Inside deferred_realized_profit_refresh() the user is only noted, and
+    outside any transaction the recompute runs straight away.
+    """
+    user_ids = getattr(_deferred, 'user_ids', None)
+    if user_ids is not None:
+        user_ids.add(user_id)
+    else:
+        transaction.on_commit(partial(refresh_realized_profit, user_id))
+
+
+@contextmanager
+def deferred_realized_profit_refresh():
+    """Coalesce the refreshes asked for in the block into one per user."""
+    if getattr(_deferred, 'user_ids', None) is not None:
+        # The outermost block schedules them
+        yield
+        return
+
+    _deferred.user_ids = user_ids = set()
+    try:
+        yield
+    finally:
+        _deferred.user_ids = None
+
+    for user_id in sorted(user_ids):
+        transaction.on_commit(partial(refresh_realized_profit, user_id))
@@ -3,14 +3,13 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import RealizedProfit
 from .serializers import RealizedProfitSerializer
+from .profit_refresh import refresh_realized_profit
 
 class RealizedProfitAPIView(APIView):
     def get(self, request, *args, **kwargs):
         user = self.request.user
         try:
-            realized_profit, created = RealizedProfit.objects.get_or_create(user=user)
-            realized_profit.update_realized_profit()
-            realized_profit.save()
+            realized_profit = refresh_realized_profit(user.id)
             serializer = RealizedProfitSerializer(realized_profit)
             return Response(serializer.data, status=status.HTTP_200_OK)
         except RealizedProfit.DoesNotExist:
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TradeUploadBlofin, LiveTrades
+from .models import TradeUploadBlofin, LiveTrades, UploadJob, UploadWatermark, Symbol, MatcherCheckpoint, TradeMatch
 from upload_csv.utils.convert_fields_to_readable import FormattingUtils
 
 
@@ -20,7 +20,7 @@ class TradeUploadBlofinAdmin(admin.ModelAdmin):
     underlying_asset_formatted.short_description = 'Asset'
 
     def avg_fill_formatted(self, obj):
-        return FormattingUtils.formatted_value(obj.avg_fill)
+        return FormattingUtils.formatted_value(obj.avg_fill, asset=obj.underlying_asset)
     avg_fill_formatted.short_description = 'Avg Fill'
 
     def filled_quantity_formatted(self, obj):
@@ -36,7 +36,7 @@ class TradeUploadBlofinAdmin(admin.ModelAdmin):
     pnl_percentage_formatted.short_description = 'PnL Percentage'
 
     def price_formatted(self, obj):
-        return FormattingUtils.formatted_price(obj.price, obj.avg_fill, obj.is_open)
+        return FormattingUtils.formatted_price(obj.price, obj.avg_fill, obj.is_open, asset=obj.underlying_asset)
     price_formatted.short_description = 'Price'
 
 
@@ -47,3 +47,43 @@ class LiveTradesAdmin(admin.ModelAdmin):
     list_filter = ('owner', 'asset', 'is_live')
     search_fields = ('owner__username', 'asset')
     ordering = ('-last_updated',)
+
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'exchange', 'file_name', 'status', 'rows_parsed',
+                    'new_trades_count', 'duplicates_count', 'canceled_count', 'created_at', 'finished_at')
+    list_filter = ('owner', 'exchange', 'status')
+    search_fields = ('owner__username', 'file_name')
+    ordering = ('-created_at',)
+
+
+@admin.register(UploadWatermark)
+class UploadWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'exchange', 'symbol', 'high_water_mark', 'last_updated')
+    list_filter = ('exchange', 'symbol')
+    search_fields = ('owner__username',)
+
+
+@admin.register(Symbol)
+class SymbolAdmin(admin.ModelAdmin):
+    list_display = ('exchange_symbol', 'quote_symbol', 'tick_precision', 'is_enabled', 'last_updated')
+    list_filter = ('is_enabled',)
+    list_editable = ('quote_symbol', 'tick_precision', 'is_enabled')
+    search_fields = ('exchange_symbol', 'quote_symbol')
+
+
+@admin.register(MatcherCheckpoint)
+class MatcherCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'asset', 'last_order_time', 'last_trade_id', 'trade_count', 'last_updated')
+    list_filter = ('asset',)
+    search_fields = ('owner__username', 'asset')
+
+
+@admin.register(TradeMatch)
+class TradeMatchAdmin(admin.ModelAdmin):
+    list_display = ('owner', 'asset', 'buy_trade', 'sell_trade', 'quantity', 'entry_price',
+                    'exit_price', 'closed_at', 'realized_pnl')
+    list_filter = ('owner', 'asset')
+    search_fields = ('owner__username', 'asset')
+    ordering = ('-closed_at',)
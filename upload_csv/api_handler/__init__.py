@@ -1 +1,5 @@
-from upload_csv.api_handler.fmp_api import fetch_quote
+from upload_csv.api_handler.fmp_api import chunk_quote_symbols
+from upload_csv.api_handler.price_sources import fetch_quote, fetch_quotes, afetch_quotes, get_price_source, reset_price_sources
+from upload_csv.api_handler.price_sources import PriceSource, FmpPriceSource, LocalPriceSource, ReplayPriceSource, PriceTape
+from upload_csv.api_handler.quote_cache import get_quotes, aget_quotes, quote_cache_stats, reset_quote_cache_stats
+from upload_csv.api_handler.quote_client import get_quote_client, QuoteProviderError, CircuitOpenError
@@ -1,28 +1,154 @@
 import requests
-from django.core.cache import cache
+import asyncio
+import threading
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import quote, unquote
 from django.conf import settings
-# import logging
+import logging
 # Import your model or wherever the trades are stored
 from upload_csv.models import TradeUploadBlofin
+from upload_csv.registry.symbol_registry import quote_symbol_for
+from upload_csv.api_handler.quote_client import get_quote_client
 
-# Configure logging
-# logging.basicConfig(level=logging.DEBUG)
-# logger = logging.getLogger(__name__)
+logger = logging.getLogger(__name__)
 
+_quote_executor = None
+_quote_executor_lock = threading.Lock()
 
-def fetch_quote(symbol):
-    symbol = symbol.rstrip('T')
-    api_url = f'https://financialmodelingprep.com/api/v3/quote/{symbol}'
-    params = {'apikey': settings.FMP_API_KEY}
+
+def fetch_quote(symbol, base_url=None, api_key=None):
+    symbol = quote_symbol_for(symbol)
+    api_url = f'{base_url or settings.FMP_BASE_URL}/quote/{symbol}'
+    params = {'apikey': settings.FMP_API_KEY if api_key is None else api_key}
 
     try:
-        response = requests.get(api_url, params=params)
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        data = response.json()
+        # Raises for bad responses once retries are used up
+        data = get_quote_client().get_json(api_url, params=params)
         if data:
             # logger.debug(f"Fetched data for symbol {symbol}: {data}")
             return data
     except requests.RequestException as e:
-        print(f"Request error for symbol")
+        logger.warning(f"Quote request failed for {symbol}.", exc_info=e)
 
     return []
+
+
+def chunk_quote_symbols(quote_symbols, batch_size=None, max_length=None):
+    """
+    Split quote symbols into lists that each fit in one quote request URL.
+
+    Symbols are URL-encoded, and each chunk holds at most `batch_size`
+    of them with a comma separated length of at most `max_length`.
+    """
+    batch_size = batch_size or settings.FMP_QUOTE_BATCH_SIZE
+    max_length = max_length or settings.FMP_QUOTE_MAX_URL_SYMBOLS_LENGTH
+
+    chunks, chunk, length = [], [], 0
+    for symbol in quote_symbols:
+        encoded = quote(symbol, safe='')
+        added_length = len(encoded) + (1 if chunk else 0)
+        if chunk and (len(chunk) >= batch_size or length + added_length > max_length):
+            chunks.append(chunk)
+            chunk, length, added_length = [], 0, len(encoded)
+        chunk.append(encoded)
+        length += added_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def get_quote_executor():
+    """Return the process-wide pool that quote chunk requests fan out on."""
+    global _quote_executor
+    with _quote_executor_lock:
+        if _quote_executor is None:
+            _quote_executor = ThreadPoolExecutor(
+                max_workers=settings.FMP_QUOTE_CONCURRENCY,
+                thread_name_prefix='quote-fetch',
+            )
+    return _quote_executor
+
+
+def group_by_quote_symbol(symbols):
+    """The exchange symbols behind each quote symbol."""
+    exchange_symbols = {}
+    for symbol in set(symbols):
+        exchange_symbols.setdefault(quote_symbol_for(symbol), []).append(symbol)
+    return exchange_symbols
+
+
+def _fetch_chunk(chunk, base_url=None, api_key=None):
+    """Quote data for one chunk of encoded symbols, or the error that stopped it."""
+    api_url = f"{base_url or settings.FMP_BASE_URL}/quote/{','.join(chunk)}"
+    try:
+        return get_quote_client().get_json(api_url, params={'apikey': settings.FMP_API_KEY if api_key is None else api_key}) or []
+    except requests.RequestException as e:
+        return e
+
+
+def _merge_chunk_results(exchange_symbols, chunk_results, failed):
+    """Price map from each chunk's quote data, noting the symbols of failed chunks."""
+    prices = {}
+    for chunk, data in chunk_results:
+        if isinstance(data, Exception):
+            logger.warning(f"Quote request failed for {len(chunk)} symbols.", exc_info=data)
+            if failed is not None:
+                for quote_symbol in chunk:
+                    failed.update(exchange_symbols[unquote(quote_symbol)])
+            continue
+
+        for quote_data in data:
+            price = quote_data.get('price')
+            # A quote without a price counts as no quote at all
+            if not isinstance(price, (int, float)) or isinstance(price, bool):
+                continue
+            for symbol in exchange_symbols.get(quote_data.get('symbol'), []):
+                prices[symbol] = price
+    return prices
+
+
+def fetch_quotes(symbols, failed=None, base_url=None, api_key=None):
+    """
+    Latest price for each exchange symbol, from as few quote requests as possible.
+
+    FMP's quote endpoint takes a comma separated list of symbols, so the
+    symbols are mapped to quote symbols, deduplicated and sent in URL-safe
+    chunks. When there are several chunks they are requested side by side,
+    at most FMP_QUOTE_CONCURRENCY at a time. Returns a dict of exchange
+    symbol to price; symbols the provider has no quote for, or whose chunk
+    failed, are left out. The symbols of failed chunks are also added to
+    `failed` if given, so callers can tell an outage from a symbol without
+    a quote. `base_url` and `api_key` default to FMP_BASE_URL and FMP_API_KEY.
+    """
+    exchange_symbols = group_by_quote_symbol(symbols)
+    chunks = chunk_quote_symbols(sorted(exchange_symbols))
+    fetch_chunk = partial(_fetch_chunk, base_url=base_url, api_key=api_key)
+
+    if len(chunks) > 1 and settings.FMP_QUOTE_CONCURRENCY > 1:
+        results = get_quote_executor().map(fetch_chunk, chunks)
+    else:
+        results = map(fetch_chunk, chunks)
+
+    return _merge_chunk_results(exchange_symbols, zip(chunks, results), failed)
+
+
+async def afetch_quotes(symbols, failed=None, base_url=None, api_key=None):
+    """
+    fetch_quotes() for async views.
+
+    Each chunk is an asyncio task, at most FMP_QUOTE_CONCURRENCY of them in
+    flight, and the blocking request itself runs in a thread.
+    """
+    # Symbol lookups may read the registry from the database
+    exchange_symbols = await sync_to_async(group_by_quote_symbol)(symbols)
+    chunks = chunk_quote_symbols(sorted(exchange_symbols))
+    semaphore = asyncio.Semaphore(max(settings.FMP_QUOTE_CONCURRENCY, 1))
+
+    async def fetch(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(_fetch_chunk, chunk, base_url, api_key)
+
+    results = await asyncio.gather(*(fetch(chunk) for chunk in chunks))
+    return _merge_chunk_results(exchange_symbols, zip(chunks, results), failed)
@@ -0,0 +1,164 @@
+from abc import ABC, abstractmethod
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from upload_csv.api_handler import fmp_api
+from upload_csv.registry.symbol_registry import quote_symbol_for
+import threading
+import csv
+
+# Every source built so far, by the settings it was built from
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+class PriceSource(ABC):
+    """
+    Where quotes come from.
+
+    A source turns exchange symbols into prices. quotes() answers for
+    many symbols at once, in the shape fetch_quotes() returns, and quote()
+    answers for one in the shape of FMP's quote endpoint. Subclasses
+    implement quotes(); the others are built on it unless overridden.
+    """
+
+    @abstractmethod
+    def quotes(self, symbols, failed=None):
+        """Price for each exchange symbol, adding those whose request failed to `failed`."""
+
+    async def aquotes(self, symbols, failed=None):
+        return await sync_to_async(self.quotes)(symbols, failed)
+
+    def quote(self, symbol):
+        prices = self.quotes([symbol])
+        if symbol not in prices:
+            return []
+        return [{'symbol': quote_symbol_for(symbol), 'price': prices[symbol]}]
+
+
+class FmpPriceSource(PriceSource):
+    """Quotes from financialmodelingprep, or any server with the same quote endpoint."""
+
+    def __init__(self, base_url=None, api_key=None):
+        self.base_url = base_url or settings.FMP_BASE_URL
+        self.api_key = settings.FMP_API_KEY if api_key is None else api_key
+
+    def quotes(self, symbols, failed=None):
+        return fmp_api.fetch_quotes(symbols, failed=failed, base_url=self.base_url, api_key=self.api_key)
+
+    async def aquotes(self, symbols, failed=None):
+        return await fmp_api.afetch_quotes(symbols, failed=failed, base_url=self.base_url, api_key=self.api_key)
+
+    def quote(self, symbol):
+        return fmp_api.fetch_quote(symbol, base_url=self.base_url, api_key=self.api_key)
+
+
+class LocalPriceSource(FmpPriceSource):
+    """Quotes from the serve_price_tape stand-in at LOCAL_QUOTE_SERVER_URL."""
+
+    def __init__(self):
+        # The stand-in takes no key, so the real one isn't sent to it
+        super().__init__(base_url=settings.LOCAL_QUOTE_SERVER_URL, api_key='')
+
+
+class PriceTape:
+    """
+    Recorded ticks, played back in order.
+
+    The tape is a CSV with `symbol` and `price` columns, one row per tick,
+    where symbol is the provider's quote symbol; other columns such as a
+    timestamp are ignored. Each symbol's ticks are handed out one per
+    request, starting over after the last, so a replay is deterministic.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ticks = {}
+        with open(path, newline='') as file:
+            for row in csv.DictReader(file):
+                self.ticks.setdefault(row['symbol'], []).append(float(row['price']))
+        self.positions = dict.fromkeys(self.ticks, 0)
+        self.lock = threading.Lock()
+
+    def next_price(self, quote_symbol):
+        """The symbol's next tick, or None when the tape has no ticks for it."""
+        ticks = self.ticks.get(quote_symbol)
+        if not ticks:
+            return None
+        with self.lock:
+            position = self.positions[quote_symbol]
+            self.positions[quote_symbol] = (position + 1) % len(ticks)
+        return ticks[position]
+
+
+class ReplayPriceSource(PriceSource):
+    """Quotes played back from the PRICE_TAPE_PATH tick file, without the network."""
+
+    def __init__(self, path=None):
+        path = path or settings.PRICE_TAPE_PATH
+        if not path:
+            raise ImproperlyConfigured("PRICE_SOURCE 'replay' needs PRICE_TAPE_PATH.")
+        self.tape = PriceTape(path)
+        # Provider requests answered, to compare with what a live run would cost
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def quotes(self, symbols, failed=None):
+        with self.lock:
+            self.calls += 1
+        prices = {}
+        for quote_symbol, exchange_symbols in fmp_api.group_by_quote_symbol(symbols).items():
+            price = self.tape.next_price(quote_symbol)
+            if price is not None:
+                prices.update(dict.fromkeys(exchange_symbols, price))
+        return prices
+
+
+PRICE_SOURCES = {
+    'fmp': FmpPriceSource,
+    'replay': ReplayPriceSource,
+    'local': LocalPriceSource,
+}
+
+
+def get_price_source():
+    """
+    Return the PRICE_SOURCE source, creating it on first use.
+
+    Sources are kept per settings, so overriding PRICE_SOURCE or
+    PRICE_TAPE_PATH, e.g. in a test, switches to a source of its own.
+    """
+    key = (settings.PRICE_SOURCE, settings.PRICE_TAPE_PATH, settings.LOCAL_QUOTE_SERVER_URL)
+    with _sources_lock:
+        if key not in _sources:
+            try:
+                source_class = PRICE_SOURCES[settings.PRICE_SOURCE]
+            except KeyError:
+                raise ImproperlyConfigured(
+                    f"Unknown PRICE_SOURCE {settings.PRICE_SOURCE!r}, "
+                    f"expected one of {', '.join(PRICE_SOURCES)}.")
+            _sources[key] = source_class()
+        return _sources[key]
+
+
+def reset_price_sources():
+    """Forget every source, so a replay starts from the top of its tape again."""
+    with _sources_lock:
+        _sources.clear()
+
+
+def fetch_quote(symbol):
+    """Quote data for one exchange symbol from the configured source."""
+    return get_price_source().quote(symbol)
+
+
+def fetch_quotes(symbols, failed=None):
+    """Price for each exchange symbol from the configured source, see fmp_api.fetch_quotes()."""
+    return get_price_source().quotes(symbols, failed=failed)
+
+
+async def afetch_quotes(symbols, failed=None):
+    """fetch_quotes() for async views."""
+    # Building the source may read the tape file
+    source = await sync_to_async(get_price_source)()
+    return await source.aquotes(symbols, failed=failed)
@@ -0,0 +1,353 @@
+from upload_csv.api_handler.price_sources import fetch_quotes
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, connection
+import threading
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STAT_NAMES = ('hits', 'stale_hits', 'negative_hits', 'misses', 'fallbacks', 'coalesced', 'refreshes')
+
+# Seconds between checks on a lease another worker holds
+LEASE_POLL_INTERVAL = 0.05
+
+_executor = None
+_executor_lock = threading.Lock()
+# Symbols with a background refresh queued or running in this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+# Symbols a thread of this process is fetching, each with the event set when it is done
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+# Counters not yet added to the shared ones
+_pending_stats = dict.fromkeys(STAT_NAMES, 0)
+_stats_flushed_at = 0.0
+_stats_lock = threading.Lock()
+
+
+def quote_cache():
+    return caches[settings.QUOTE_CACHE_ALIAS]
+
+
+def quote_ttl(symbol):
+    """Seconds a cached quote for the symbol counts as fresh."""
+    return settings.QUOTE_CACHE_SYMBOL_TTLS.get(symbol, settings.QUOTE_CACHE_TTL)
+
+
+def _quote_key(symbol):
+    return f'quote:{symbol}'
+
+
+def _lease_key(symbol):
+    return f'quote-lease:{symbol}'
+
+
+def _stat_key(name):
+    return f'quote-stats:{name}'
+
+
+def get_quotes(symbols):
+    """
+    Price for each exchange symbol, served from the shared quote cache.
+
+    Fresh quotes are returned as they are. Quotes past their TTL are still
+    returned, for up to QUOTE_CACHE_STALE_TTL seconds, while one background
+    refresh replaces them. Symbols the provider recently had no quote for
+    are left out, like fetch_quotes does, and only the remaining misses
+    are fetched before returning. If the provider is down, missed symbols
+    fall back to their last known price, kept for QUOTE_CACHE_LAST_KNOWN_TTL.
+    A symbol is only fetched by one caller at a time, see fetch_missing().
+    """
+    symbols = set(symbols)
+    if not symbols:
+        return {}
+
+    entries = quote_cache().get_many([_quote_key(symbol) for symbol in symbols])
+    now = time.time()
+    stats = dict.fromkeys(STAT_NAMES, 0)
+    prices, stale, missing, last_known = {}, [], [], {}
+
+    for symbol in symbols:
+        entry = entries.get(_quote_key(symbol))
+        age = now - entry['fetched_at'] if entry else None
+        if entry is not None and entry['price'] is None:
+            stats['negative_hits'] += 1
+        elif entry is not None and age < quote_ttl(symbol):
+            prices[symbol] = entry['price']
+            stats['hits'] += 1
+        elif entry is not None and age < quote_ttl(symbol) + settings.QUOTE_CACHE_STALE_TTL:
+            prices[symbol] = entry['price']
+            stale.append(symbol)
+            stats['stale_hits'] += 1
+        else:
+            if entry is not None:
+                last_known[symbol] = entry['price']
+            missing.append(symbol)
+            stats['misses'] += 1
+
+    if missing:
+        fetched, failed = fetch_missing(missing, last_known, stats)
+        prices.update(fetched)
+        for symbol in failed & last_known.keys():
+            prices[symbol] = last_known[symbol]
+            stats['fallbacks'] += 1
+    if stale:
+        schedule_refresh(stale)
+
+    record_stats(stats)
+    return prices
+
+
+async def aget_quotes(symbols):
+    """get_quotes() for async views; the cache and the provider are used from a worker thread."""
+    return await sync_to_async(get_quotes)(symbols)
+
+
+def refresh_quotes(symbols, failed=None):
+    """
+    Fetch the symbols from the provider and cache its answers.
+
+    Symbols it has no quote for, or no numeric price, are cached as
+    misses. Symbols whose request failed are added to `failed` and keep
+    their cached entry.
+    """
+    failed = set() if failed is None else failed
+    prices = {
+        symbol: price for symbol, price in fetch_quotes(symbols, failed=failed).items()
+        if isinstance(price, (int, float)) and not isinstance(price, bool)
+    }
+    now = time.time()
+
+    # set_many takes one timeout, so entries are grouped by theirs
+    entries_by_timeout = defaultdict(dict)
+    for symbol in symbols:
+        if symbol in failed:
+            continue
+        if symbol in prices:
+            entries_by_timeout[settings.QUOTE_CACHE_LAST_KNOWN_TTL][_quote_key(symbol)] = {
+                'price': prices[symbol], 'fetched_at': now}
+        else:
+            entries_by_timeout[settings.QUOTE_CACHE_NEGATIVE_TTL][_quote_key(symbol)] = {'price': None, 'fetched_at': now}
+
+    cache = quote_cache()
+    for timeout, entries in entries_by_timeout.items():
+        cache.set_many(entries, timeout)
+    return prices
+
+
+def fetch_missing(symbols, last_known, stats):
+    """
+    Fetch missed symbols, with one fetch per symbol in flight across
+    threads and workers.
+
+    The first thread of a process to miss a symbol marks it in flight,
+    then takes a cache-backed lease on it, and only leased symbols are
+    fetched. A symbol someone else is fetching gets its last known price
+    if it has one. Otherwise the caller waits for that fetch, for up to
+    QUOTE_CACHE_LEASE_TTL seconds, and reads its result from the cache.
+    Returns the prices and the symbols whose fetch failed.
+    """
+    done = threading.Event()
+    with _in_flight_lock:
+        waiting_on = {symbol: _in_flight[symbol] for symbol in symbols if symbol in _in_flight}
+        mine = [symbol for symbol in symbols if symbol not in waiting_on]
+        for symbol in mine:
+            _in_flight[symbol] = done
+
+    prices, failed = {}, set()
+    try:
+        token, leased = acquire_leases(mine)
+        try:
+            if leased:
+                prices.update(refresh_quotes(leased, failed))
+        finally:
+            release_leases(leased, token)
+
+        # Symbols another thread or worker is fetching
+        others = [symbol for symbol in symbols if symbol not in leased]
+        for symbol in others:
+            if symbol in last_known:
+                prices[symbol] = last_known[symbol]
+        wait_for = [symbol for symbol in others if symbol not in last_known]
+        stats['coalesced'] += len(others)
+
+        if wait_for:
+            deadline = time.monotonic() + settings.QUOTE_CACHE_LEASE_TTL
+            for event in {waiting_on[symbol] for symbol in wait_for if symbol in waiting_on}:
+                event.wait(max(0, deadline - time.monotonic()))
+            wait_for_leases([symbol for symbol in wait_for if symbol not in waiting_on], deadline)
+
+            # Only an entry that fetch wrote is its result; an older one means it failed
+            entries = quote_cache().get_many([_quote_key(symbol) for symbol in wait_for])
+            now = time.time()
+            for symbol in wait_for:
+                entry = entries.get(_quote_key(symbol))
+                if entry is None or now - entry['fetched_at'] >= quote_ttl(symbol):
+                    failed.add(symbol)
+                elif entry['price'] is not None:
+                    prices[symbol] = entry['price']
+    finally:
+        with _in_flight_lock:
+            for symbol in mine:
+                del _in_flight[symbol]
+        done.set()
+    return prices, failed
+
+
+def refresh_quotes_once(symbols):
+    """
+    Fetch every symbol again, as one more caller of the single flight.
+
+    For callers that want fresh prices whatever the cache holds, like the
+    live price poller. Symbols another thread or worker is fetching are
+    read from the cache once that fetch is done instead of fetched twice,
+    and symbols without a fresh price are left out.
+    """
+    stats = dict.fromkeys(STAT_NAMES, 0)
+    prices, _ = fetch_missing(set(symbols), {}, stats)
+    record_stats(stats)
+    return prices
+
+
+def acquire_leases(symbols):
+    """
+    Take the fetch lease on each symbol no other worker holds.
+
+    Returns the token the leases were taken with and the leased symbols.
+    A lease expires after QUOTE_CACHE_LEASE_TTL seconds, in case its
+    holder dies before releasing it.
+    """
+    token = uuid.uuid4().hex
+    cache = quote_cache()
+    leased = {symbol for symbol in symbols
+              if cache.add(_lease_key(symbol), token, settings.QUOTE_CACHE_LEASE_TTL)}
+    return token, leased
+
+
+def release_leases(symbols, token):
+    """Release leases taken with the token, leaving any taken over since they expired."""
+    if not symbols:
+        return
+    cache = quote_cache()
+    held = cache.get_many([_lease_key(symbol) for symbol in symbols])
+    cache.delete_many([key for key, holder in held.items() if holder == token])
+
+
+def wait_for_leases(symbols, deadline):
+    """Wait until no worker holds a lease on the symbols, or until the deadline."""
+    cache = quote_cache()
+    keys = [_lease_key(symbol) for symbol in symbols]
+    while keys and time.monotonic() < deadline:
+        keys = list(cache.get_many(keys))
+        if keys:
+            time.sleep(LEASE_POLL_INTERVAL)
+
+
+def get_executor():
+    """Return the process-wide quote refresh pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='quote-refresh')
+    return _executor
+
+
+def schedule_refresh(symbols):
+    """Refresh stale symbols in the background, unless a refresh already has them."""
+    with _refreshing_lock:
+        symbols = [symbol for symbol in symbols if symbol not in _refreshing]
+        _refreshing.update(symbols)
+    if not symbols:
+        return
+
+    if settings.QUOTE_CACHE_REFRESH_ASYNC:
+        get_executor().submit(_refresh_in_worker, symbols)
+    else:
+        _refresh(symbols)
+
+
+def _refresh_in_worker(symbols):
+    # The refresh thread gets its own connection, which must not outlive it
+    close_old_connections()
+    try:
+        _refresh(symbols)
+    finally:
+        connection.close()
+
+
+def _refresh(symbols):
+    leased = set()
+    try:
+        # Symbols another worker holds a lease on are being refreshed already
+        token, leased = acquire_leases(symbols)
+        if leased:
+            refresh_quotes(leased)
+            record_stats({'refreshes': 1})
+    except Exception:
+        logger.exception(f"Refreshing quotes for {len(symbols)} symbols failed.")
+    finally:
+        if leased:
+            release_leases(leased, token)
+        with _refreshing_lock:
+            _refreshing.difference_update(symbols)
+
+
+def record_stats(stats):
+    """
+    Count cache outcomes in this process.
+
+    The counts are added to the counters shared by every worker at most
+    every QUOTE_CACHE_STATS_FLUSH_INTERVAL seconds, so a cache hit doesn't
+    also cost a write.
+    """
+    with _stats_lock:
+        for name, count in stats.items():
+            _pending_stats[name] += count
+        if time.monotonic() - _stats_flushed_at < settings.QUOTE_CACHE_STATS_FLUSH_INTERVAL:
+            return
+    flush_stats()
+
+
+def flush_stats():
+    """Add this process's pending counts to the shared counters."""
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = {name: count for name, count in _pending_stats.items() if count}
+        for name in pending:
+            _pending_stats[name] = 0
+        _stats_flushed_at = time.monotonic()
+
+    cache = quote_cache()
+    for name, count in pending.items():
+        key = _stat_key(name)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # First count since the counters were reset or evicted
+            if not cache.add(key, count, None):
+                cache.incr(key, count)
+
+
+def quote_cache_stats():
+    """Counters since the last reset, with the share of lookups served from the cache."""
+    flush_stats()
+    values = quote_cache().get_many([_stat_key(name) for name in STAT_NAMES])
+    stats = {name: values.get(_stat_key(name), 0) for name in STAT_NAMES}
+
+    # Fallbacks and coalesced lookups are counted as misses as well
+    lookups = stats['hits'] + stats['stale_hits'] + stats['negative_hits'] + stats['misses']
+    stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else None
+    return stats
+
+
+def reset_quote_cache_stats():
+    with _stats_lock:
+        for name in STAT_NAMES:
+            _pending_stats[name] = 0
+    quote_cache().delete_many([_stat_key(name) for name in STAT_NAMES])
@@ -0,0 +1,191 @@
+from bisect import bisect_left
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import logging
+import random
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in milliseconds, of the latency histogram buckets
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+
+# Statuses worth trying again; any other error status fails straight away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class QuoteProviderError(requests.RequestException):
+    """The quote provider could not be reached or kept failing."""
+
+
+class CircuitOpenError(QuoteProviderError):
+    """The circuit breaker is open, so the provider was not called."""
+
+
+class CircuitBreaker:
+    """
+    Stop calling a provider that keeps failing, then probe it again.
+
+    After `failure_threshold` failures in a row the breaker opens and
+    calls fail fast. Once `reset_timeout` seconds have passed one call is
+    let through; its success closes the breaker, its failure reopens it.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.probing or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    logger.warning(f"Quote provider circuit opened after {self.failures} failures.")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class QuoteClient:
+    """
+    Keep-alive HTTP client for the quote provider.
+
+    Requests share one pooled session, with connect and read timeouts.
+    Connection errors, timeouts and throttling or server errors are
+    retried with jittered exponential backoff, and a circuit breaker
+    fails calls fast while the provider is down. Every attempt's latency
+    goes into a histogram.
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=settings.FMP_POOL_SIZE, pool_maxsize=settings.FMP_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = (settings.FMP_CONNECT_TIMEOUT, settings.FMP_READ_TIMEOUT)
+        self.breaker = CircuitBreaker(
+            settings.FMP_CIRCUIT_FAILURE_THRESHOLD, settings.FMP_CIRCUIT_RESET_TIMEOUT)
+        self.stats_lock = threading.Lock()
+        self.latency_counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.latency_total_ms = 0.0
+        self.counters = {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+
+    def get_json(self, url, params=None):
+        """GET a URL and return its decoded JSON body, or raise QuoteProviderError."""
+        self.count('calls')
+        if not self.breaker.allow():
+            self.count('short_circuited')
+            raise CircuitOpenError(f"Quote provider circuit is open, not calling {url}")
+
+        attempts = settings.FMP_MAX_RETRIES + 1
+        succeeded = False
+        try:
+            for attempt in range(attempts):
+                if attempt:
+                    self.count('retries')
+                    # Full jitter keeps workers that failed together from retrying together
+                    time.sleep(random.uniform(0, settings.FMP_RETRY_BACKOFF * 2 ** (attempt - 1)))
+
+                self.count('attempts')
+                start_time = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+                    retry = response.status_code in RETRY_STATUSES
+                    if not retry:
+                        response.raise_for_status()
+                        data = response.json()
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error, retry = e, True
+                except (requests.RequestException, ValueError) as e:
+                    # Client errors and bad bodies won't get better on a retry
+                    error, retry = e, False
+                else:
+                    error = None if not retry else requests.HTTPError(
+                        f"{response.status_code} from quote provider", response=response)
+                finally:
+                    self.record_latency((time.perf_counter() - start_time) * 1000)
+
+                if error is None:
+                    succeeded = True
+                    return data
+                if not retry:
+                    break
+
+            raise QuoteProviderError(f"Quote request failed: {error}") from error
+        finally:
+            # Every way out records a result, even an unexpected exception, or
+            # a half-open breaker would wait on its probe forever
+            if succeeded:
+                self.breaker.record_success()
+            else:
+                self.count('failures')
+                self.breaker.record_failure()
+
+    def count(self, name):
+        with self.stats_lock:
+            self.counters[name] += 1
+
+    def record_latency(self, latency_ms):
+        with self.stats_lock:
+            self.latency_counts[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+            self.latency_total_ms += latency_ms
+
+    def stats(self):
+        """Counters, circuit state and latency histogram of this process."""
+        with self.stats_lock:
+            histogram = {
+                ('+Inf' if bound == float('inf') else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS_MS, self.latency_counts)
+            }
+            attempts = self.counters['attempts']
+            return {
+                **self.counters,
+                'circuit_state': self.breaker.state,
+                'latency_ms_buckets': histogram,
+                'latency_ms_mean': round(self.latency_total_ms / attempts, 2) if attempts else None,
+                'pid': os.getpid(),
+            }
+
+
+def get_quote_client():
+    """Return this process's quote client, creating it on first use and after a fork."""
+    global _client, _client_pid
+    with _client_lock:
+        # A session copied into a forked worker would share its parent's sockets
+        if _client is None or _client_pid != os.getpid():
+            _client = QuoteClient()
+            _client_pid = os.getpid()
+    return _client
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class UploadCsvConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'upload_csv'
+
+    def ready(self):
+        import upload_csv.signals  # Importing the signals module to ensure signals are connected
@@ -0,0 +1,3 @@
+from upload_csv.benchmarks.blofin_csv_generator import generate_blofin_rows, write_blofin_csv
+from upload_csv.benchmarks.price_tape import generate_price_ticks, write_price_tape
+from upload_csv.benchmarks.ingestion_benchmark import IngestionBenchmark, compare_to_baseline
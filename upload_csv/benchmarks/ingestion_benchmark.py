@@ -0,0 +1,180 @@
+from upload_csv.benchmarks.blofin_csv_generator import write_blofin_csv
+from upload_csv.benchmarks.price_tape import write_price_tape
+from upload_csv.api_handler.price_sources import get_price_source, reset_price_sources
+from upload_csv.exchange.blofin import BloFinHandler, CsvProcessor
+from upload_csv.exchange.blofin_trade_matcher import TradeIdMatcher
+from upload_csv.exchange.live_price_updater import LiveTradeUpdater
+from upload_csv.models import UploadJob
+from contextlib import contextmanager
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+import tempfile
+import tracemalloc
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCounter:
+    """Database execute wrapper that counts queries without keeping their SQL."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class IngestionBenchmark:
+    """
+    Time a synthetic BloFin upload end to end, one stage at a time.
+
+    Every stage reports wall time, SQL query count, rows per second and
+    peak Python memory. All writes happen inside one transaction that is
+    rolled back at the end, so the benchmark can run against any database.
+    Quotes are replayed from a price tape, so no provider is called.
+    """
+
+    def __init__(self, rows=10000, seed=0, chunk_size=None, through_view=False, csv_path=None,
+                 price_tape_path=None, price_tape_ticks=100):
+        self.rows = rows
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.through_view = through_view
+        self.csv_path = csv_path
+        self.price_tape_path = price_tape_path
+        self.price_tape_ticks = price_tape_ticks
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, rows):
+        counter = QueryCounter()
+        tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            yield
+        wall_time = time.perf_counter() - start_time
+        _, peak = tracemalloc.get_traced_memory()
+
+        self.stages[name] = {
+            'wall_time_s': round(wall_time, 4),
+            'queries': counter.count,
+            'rows': rows,
+            'rows_per_s': round(rows / wall_time, 1) if wall_time else None,
+            'peak_memory_mb': round(peak / (1024 * 1024), 2),
+        }
+        logger.info(f"Benchmark stage {name}: {self.stages[name]}")
+
+    def run(self):
+        csv_path = self.csv_path
+        if csv_path is None:
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as file:
+                write_blofin_csv(file, self.rows, seed=self.seed)
+            csv_path = file.name
+
+        price_tape_path = self.price_tape_path
+        if price_tape_path is None:
+            with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as file:
+                write_price_tape(file, self.price_tape_ticks, seed=self.seed)
+            price_tape_path = file.name
+
+        tracemalloc.start()
+        try:
+            with override_settings(PRICE_SOURCE='replay', PRICE_TAPE_PATH=price_tape_path), \
+                    transaction.atomic():
+                # Every run replays the tape from its first tick
+                reset_price_sources()
+                source = get_price_source()
+                owner = User.objects.create(
+                    username=f'benchmark-{timezone.now().timestamp():.0f}')
+                if self.through_view:
+                    breakdown = self.run_through_view(owner, csv_path)
+                else:
+                    breakdown = self.run_stages(owner, csv_path)
+                transaction.set_rollback(True)
+        finally:
+            tracemalloc.stop()
+            if self.csv_path is None:
+                os.remove(csv_path)
+            if self.price_tape_path is None:
+                os.remove(price_tape_path)
+
+        return {
+            'rows': self.rows,
+            'seed': self.seed,
+            'chunk_size': self.chunk_size,
+            'through_view': self.through_view,
+            'database': connection.vendor,
+            'quote_calls': source.calls,
+            'stages': self.stages,
+            'breakdown': breakdown,
+            'total_wall_time_s': round(
+                sum(stage['wall_time_s'] for stage in self.stages.values()), 4),
+        }
+
+    def run_stages(self, owner, csv_path):
+        """Drive CsvProcessor, TradeIdMatcher and LiveTradeUpdater directly."""
+        processor = CsvProcessor(BloFinHandler())
+        with self.stage('ingest', self.rows), open(csv_path, 'rb') as file:
+            new_trades_count, _, _ = processor.process_csv_file(
+                file, owner, 'BloFin', chunk_size=self.chunk_size)
+
+        with self.stage('match', new_trades_count):
+            TradeIdMatcher(owner).check_trade_ids()
+
+        with self.stage('live_prices', owner.live_trades.count()):
+            LiveTradeUpdater().update_live_prices_for_live_trades()
+
+        return {key: round(value, 4) for key, value in processor.stage_timings.items()}
+
+    def run_through_view(self, owner, csv_path):
+        """Post the file to UploadFileView, with the job run inline, then refresh prices."""
+        # Imported here so the views module is only loaded when it is used
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from upload_csv.views import UploadFileView
+
+        overrides = {'UPLOAD_JOBS_ASYNC': False}
+        if self.chunk_size:
+            overrides['UPLOAD_CSV_CHUNK_SIZE'] = self.chunk_size
+
+        with self.stage('upload', self.rows), override_settings(**overrides), \
+                open(csv_path, 'rb') as file:
+            upload = UploadedFile(file, name='benchmark.csv', content_type='text/csv',
+                                  size=os.path.getsize(csv_path))
+            request = APIRequestFactory().post(
+                '/upload/', {'file': upload, 'exchange': 'BloFin'}, format='multipart')
+            force_authenticate(request, user=owner)
+            response = UploadFileView.as_view()(request)
+
+        if response.status_code >= 400:
+            raise ValueError(f"Upload was rejected: {response.data}")
+
+        job = UploadJob.objects.get(id=response.data['job_id'])
+        with self.stage('live_prices', owner.live_trades.count()):
+            LiveTradeUpdater().update_live_prices_for_live_trades()
+
+        return {'job_status': job.status, 'job_error': job.error,
+                **{key: round(value, 4) for key, value in job.stage_timings.items()}}
+
+
+def compare_to_baseline(report, baseline):
+    """Ratio of each stage's metrics against the same stage in a stored report."""
+    comparison = {}
+    for name, stage in report['stages'].items():
+        previous = baseline.get('stages', {}).get(name)
+        if not previous:
+            continue
+        comparison[name] = {
+            'wall_time_ratio': round(stage['wall_time_s'] / previous['wall_time_s'], 3)
+            if previous['wall_time_s'] else None,
+            'queries_delta': stage['queries'] - previous['queries'],
+            'peak_memory_ratio': round(stage['peak_memory_mb'] / previous['peak_memory_mb'], 3)
+            if previous['peak_memory_mb'] else None,
+        }
+    return comparison
@@ -0,0 +1,33 @@
+import csv
+import random
+
+from upload_csv.registry.symbol_registry import quote_symbol_for
+from upload_csv.benchmarks.blofin_csv_generator import DEFAULT_ASSET_PRICES
+
+PRICE_TAPE_COLUMNS = ['symbol', 'price']
+
+
+def generate_price_ticks(ticks, seed=0, asset_prices=None):
+    """
+    Yield (quote symbol, price) rows for a replayable price tape.
+
+    Each asset gets `ticks` prices from a seeded random walk around the
+    generator's starting prices, interleaved the way a recording of
+    batched quote requests would be.
+    """
+    rng = random.Random(seed)
+    prices = dict(asset_prices or DEFAULT_ASSET_PRICES)
+    quote_symbols = {asset: quote_symbol_for(asset) for asset in prices}
+
+    for _ in range(ticks):
+        for asset, price in prices.items():
+            price *= 1 + rng.gauss(0, 0.002)
+            prices[asset] = price
+            yield quote_symbols[asset], round(price, 8)
+
+
+def write_price_tape(file, ticks, seed=0, asset_prices=None):
+    """Write a synthetic price tape, as ReplayPriceSource reads it, to an open text file."""
+    writer = csv.writer(file)
+    writer.writerow(PRICE_TAPE_COLUMNS)
+    writer.writerows(generate_price_ticks(ticks, seed=seed, asset_prices=asset_prices))
@@ -1 +1,2 @@
 from upload_csv.calculations.long_short import calculate_trade_pnl_and_percentage
+from upload_csv.calculations.fifo_matching import new_lot, match_fifo, match_fifo_vectorized, fifo_split, fifo_fills, fixed_point_places, to_fixed_point, dump_open_lots, load_open_lots
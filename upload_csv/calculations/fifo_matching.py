@@ -0,0 +1,191 @@
+from collections import deque
+from decimal import Decimal
+import numpy as np
+
+# Largest total quantity, in fixed point, that int64 cumulative sums can hold
+_INT64_LIMIT = np.iinfo(np.int64).max
+
+
+def new_lot(trade_id, quantity):
+    """Matching state for one trade, before any of it has been matched."""
+    return {'id': trade_id, 'value': quantity, 'is_matched': False,
+            'is_partially_matched': False, 'is_open': True}
+
+
+def match_fifo(buy_status, sell_status, fills=None):
+    """
+    Match sells against buys first in, first out, entirely in memory.
+
+    Both lists hold lots from new_lot() in order_time order and are updated
+    in place: 'value' ends as each trade's unmatched quantity. A buy that
+    is only partly closed is flagged as partially matched. A sell bigger
+    than the open buys stays open with the remainder. Each non-zero
+    (buy id, sell id, quantity) match is appended to `fills` if given.
+    """
+    open_sells = deque(sell_status)
+
+    i = 0  # Pointer for `buy_status`
+    while i < len(buy_status) and open_sells:
+        buy = buy_status[i]
+        sell = open_sells[0]
+
+        quantity = min(buy['value'], sell['value'])
+        if fills is not None and quantity:
+            fills.append((buy['id'], sell['id'], quantity))
+
+        if buy['value'] >= sell['value']:
+            buy['value'] -= sell['value']
+            sell['value'] = 0
+            sell['is_matched'] = True
+            sell['is_open'] = False
+            open_sells.popleft()
+
+            if buy['value'] == 0:
+                buy['is_matched'] = True
+                buy['is_open'] = False
+                buy['is_partially_matched'] = False
+            else:
+                buy['is_partially_matched'] = True
+        else:
+            sell['value'] -= buy['value']
+            buy['value'] = 0
+            buy['is_matched'] = True
+            buy['is_open'] = False
+            buy['is_partially_matched'] = False
+
+        if buy['value'] == 0:
+            i += 1
+
+    return buy_status, sell_status
+
+
+def dump_open_lots(lots):
+    """JSON-safe copy of the lots still open, for a matcher checkpoint."""
+    return [
+        {'id': lot['id'], 'value': str(lot['value']),
+         'is_partially_matched': lot['is_partially_matched']}
+        for lot in lots if lot['is_open']
+    ]
+
+
+def load_open_lots(data):
+    """Rebuild open lots saved by dump_open_lots()."""
+    return [
+        {'id': lot['id'], 'value': Decimal(lot['value']), 'is_matched': False,
+         'is_partially_matched': lot['is_partially_matched'], 'is_open': True}
+        for lot in data
+    ]
+
+
+def fixed_point_places(values):
+    """
+    Decimal places needed to hold every quantity as an integer.
+
+    None when a quantity is zero or negative, which the FIFO loop treats
+    in ways that don't follow from cumulative sums.
+    """
+    places = 0
+    for value in values:
+        if value <= 0:
+            return None
+        places = max(places, -value.normalize().as_tuple().exponent)
+    return places
+
+
+def to_fixed_point(values, places):
+    """Quantities as an int64 array in units of 10**-places, or None on overflow."""
+    quantities = [int(value.scaleb(places)) for value in values]
+    if sum(quantities) > _INT64_LIMIT:
+        return None
+    return np.array(quantities, dtype=np.int64)
+
+
+def fifo_split(buy_quantities, sell_quantities):
+    """
+    Where FIFO matching stops on each side, from int64 quantity arrays.
+
+    The sells consume the buys up to whichever side has less in total.
+    Lots whose cumulative quantity stays within that amount are fully
+    matched, at most one lot on each side is split, and the rest are left
+    alone, so one searchsorted per side finds the split. Returns, for
+    buys and then sells, the number of fully matched lots and what is
+    left of the next lot (None when there is no next lot).
+    """
+    consumed = min(int(buy_quantities.sum()), int(sell_quantities.sum()))
+
+    splits = []
+    for quantities in (buy_quantities, sell_quantities):
+        cumulative = np.cumsum(quantities)
+        fully_matched = int(np.searchsorted(cumulative, consumed, side='right'))
+        remainder = None
+        if fully_matched < len(quantities):
+            remainder = int(cumulative[fully_matched]) - consumed
+        splits.append((fully_matched, remainder))
+    return splits
+
+
+def fifo_fills(buy_quantities, sell_quantities):
+    """
+    Every (buy index, sell index, quantity) match FIFO makes, in order.
+
+    Each cumulative quantity on either side ends a fill, up to the amount
+    consumed; searchsorted finds the buy and the sell each fill falls in.
+    """
+    buy_cumulative = np.cumsum(buy_quantities)
+    sell_cumulative = np.cumsum(sell_quantities)
+    consumed = min(buy_cumulative[-1] if len(buy_cumulative) else 0,
+                   sell_cumulative[-1] if len(sell_cumulative) else 0)
+    if not consumed:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, empty
+
+    ends = np.union1d(buy_cumulative, sell_cumulative)
+    ends = ends[ends <= consumed]
+    starts = np.concatenate(([0], ends[:-1]))
+    return (
+        np.searchsorted(buy_cumulative, starts, side='right'),
+        np.searchsorted(sell_cumulative, starts, side='right'),
+        ends - starts,
+    )
+
+
+def match_fifo_vectorized(buy_status, sell_status, fills=None):
+    """
+    Same result as match_fifo(), worked out with fifo_split() and fifo_fills().
+
+    Quantities that don't fit int64 fixed point, and zero or negative
+    ones, go through match_fifo(), which stays the reference
+    implementation for differential testing.
+    """
+    places = fixed_point_places(lot['value'] for lot in buy_status + sell_status)
+    if places is None:
+        return match_fifo(buy_status, sell_status, fills)
+
+    buy_quantities = to_fixed_point([lot['value'] for lot in buy_status], places)
+    sell_quantities = to_fixed_point([lot['value'] for lot in sell_status], places)
+    if buy_quantities is None or sell_quantities is None:
+        return match_fifo(buy_status, sell_status, fills)
+
+    if fills is not None:
+        for buy_index, sell_index, quantity in zip(*fifo_fills(buy_quantities, sell_quantities)):
+            fills.append((buy_status[buy_index]['id'], sell_status[sell_index]['id'],
+                          Decimal(int(quantity)).scaleb(-places)))
+
+    splits = fifo_split(buy_quantities, sell_quantities)
+    for lots, quantities, (fully_matched, remainder), is_buy in (
+            (buy_status, buy_quantities, splits[0], True),
+            (sell_status, sell_quantities, splits[1], False)):
+        for lot in lots[:fully_matched]:
+            lot['value'] = Decimal(0)
+            lot['is_matched'] = True
+            lot['is_open'] = False
+            lot['is_partially_matched'] = False
+
+        # The next lot is split if the consumed amount reaches into it
+        if remainder is not None and remainder < quantities[fully_matched]:
+            lot = lots[fully_matched]
+            lot['value'] = Decimal(remainder).scaleb(-places)
+            if is_buy:
+                lot['is_partially_matched'] = True
+
+    return buy_status, sell_status
@@ -1,91 +1,282 @@
 # File imports
 from upload_csv.calculations.long_short import calculate_trade_pnl_and_percentage
-from upload_csv.api_handler.fmp_api import fetch_quote
+from upload_csv.api_handler.price_sources import fetch_quote
+from upload_csv.api_handler.quote_cache import get_quotes
 from upload_csv.utils.convert_to_decimal import convert_to_decimal
 from upload_csv.utils.convert_to_native_datetime import convert_to_naive_datetime
 from upload_csv.utils.convert_to_boolean import convert_to_boolean
+from upload_csv.utils.convert_to_decimal import convert_column_to_decimal
+from upload_csv.utils.convert_to_native_datetime import convert_column_to_naive_datetime
+from upload_csv.utils.convert_to_boolean import convert_column_to_boolean
+from upload_csv.utils.trade_fingerprint import build_trade_fingerprint
+from upload_csv.registry.symbol_registry import enabled_symbols
 # Modal imports
 from upload_csv.models import TradeUploadBlofin
 # Pachage and library imports
 from decimal import Decimal, DivisionByZero,  InvalidOperation
-from datetime import datetime
-from django.core.paginator import Paginator, EmptyPage
+from datetime import timedelta
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.utils import timezone
-from django.db.models import Sum, Q
-from collections import deque, defaultdict
-import requests
+from django.db import transaction
+from django.conf import settings
+from collections import defaultdict
+import pandas as pd
+import numpy as np
+import logging
+import time
 
-import pytz
+logger = logging.getLogger(__name__)
 
+REQUIRED_COLUMNS = frozenset([
+    'Underlying Asset', 'Margin Mode', 'Leverage', 'Order Time', 'Side', 'Avg Fill',
+    'Price', 'Filled', 'Total', 'PNL', 'PNL%', 'Fee', 'Order Options', 'Reduce-only', 'Status',
+])
 
 
+def read_csv_header(file):
+    """Read only the header row of an uploaded CSV and rewind the file."""
+    columns = set(pd.read_csv(file, nrows=0).columns)
+    file.seek(0)
+    return columns
 
 
 class CsvProcessor:
     def __init__(self, handler: 'BloFinHandler'):
         self.handler = handler
+        # Seconds spent in each ingestion stage, summed over all chunks
+        self.stage_timings = defaultdict(float)
+
+    def process_csv_file(self, file, user, exchange, chunk_size=None, on_chunk=None):
+        """
+        Stream a CSV file through process_csv_data in fixed-size chunks.
+
+        Each chunk is committed on its own, so only one chunk of rows is ever
+        held in memory regardless of the size of the file. `on_chunk` is
+        called after every commit with the running counters.
+        """
+        chunk_size = chunk_size or settings.UPLOAD_CSV_CHUNK_SIZE
+        rows_parsed = new_trades_count = duplicates_count = canceled_count = 0
+        chunks = pd.read_csv(file, chunksize=chunk_size)
+
+        while True:
+            start_time = time.perf_counter()
+            chunk = next(chunks, None)
+            self.stage_timings['read'] += time.perf_counter() - start_time
+            if chunk is None:
+                break
+
+            with transaction.atomic():
+                new_count, duplicates, canceled = self.process_csv_data(
+                    chunk, user, exchange)
+
+            rows_parsed += len(chunk)
+            new_trades_count += new_count
+            duplicates_count += duplicates
+            canceled_count += canceled
+
+            if on_chunk:
+                on_chunk(rows_parsed, new_trades_count,
+                         duplicates_count, canceled_count)
+
+        return new_trades_count, duplicates_count, canceled_count
 
     def process_csv_data(self, csv_data, user, exchange):
-        """Process CSV data, only adding new trades."""
-        new_trades = []
-        duplicates = []
-        duplicates_count = 0
-        canceled_count = 0
-
-        for row in csv_data:
-            trade_status = row.get('Status', None)
-            if trade_status == 'Canceled':
-                canceled_count += 1
-                continue
-
-            trade = self.handler.process_row(row, user, exchange)
-            if trade:
-                if self.is_duplicate(trade):
-                    duplicates_count += 1
-                    # print(f"Duplicate found. Total duplicates so far: {duplicates_count}")
-                else:
-                    new_trades.append(trade)
-                    # print(f"{row}) New trade added. Total new trades so far: {len(new_trades)}")
-            else:
-                # print(f"{row}) Trade was None, not adding to new_trades.")
-                # duplicates_count = 1
-                duplicates.append(trade)
-
-        # print(f"Final duplicate count: {len(duplicates)}")
-        # print(f"Final new trades count: {len(new_trades)}")
-
-        # Bulk create new trades in the database
-        TradeUploadBlofin.objects.bulk_create(new_trades)
-
-        return len(new_trades), len(duplicates), canceled_count
-
-    def is_duplicate(self, trade):
-        """Check if a trade is a duplicate within tolerance."""
-        TOLERANCE = Decimal('0.0001')
-
-        duplicate_queryset = TradeUploadBlofin.objects.filter(
-            order_time=trade.order_time,
-            underlying_asset=trade.underlying_asset,
-            fee=trade.fee
-        ).filter(
-            Q(avg_fill__lte=trade.avg_fill + TOLERANCE) &
-            Q(avg_fill__gte=trade.avg_fill - TOLERANCE)
+        """Process a CSV DataFrame, only adding new trades."""
+        start_time = time.perf_counter()
+        trades, canceled_count, skipped_count = self.handler.process_frame(
+            csv_data, user, exchange)
+        self.stage_timings['parse'] += time.perf_counter() - start_time
+
+        # Rows repeated within the chunk collapse onto one fingerprint
+        start_time = time.perf_counter()
+        trades_by_fingerprint = {trade.fingerprint: trade for trade in trades}
+        existing_fingerprints = set(TradeUploadBlofin.objects.filter(
+            fingerprint__in=list(trades_by_fingerprint)
+        ).values_list('fingerprint', flat=True))
+
+        new_trades = [
+            trade for fingerprint, trade in trades_by_fingerprint.items()
+            if fingerprint not in existing_fingerprints
+        ]
+        duplicates_count = skipped_count + len(trades) - len(new_trades)
+        self.stage_timings['dedup'] += time.perf_counter() - start_time
+
+        # The unique fingerprint lets the database drop any trade that
+        # arrived from a concurrent upload since the lookup above
+        start_time = time.perf_counter()
+        TradeUploadBlofin.objects.bulk_create(
+            new_trades,
+            batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE,
+            ignore_conflicts=True,
         )
+        self.stage_timings['insert'] += time.perf_counter() - start_time
 
-        is_duplicate = duplicate_queryset.exists()
+        return len(new_trades), duplicates_count, canceled_count
 
-        if is_duplicate:
-            print(f"Duplicate check: Trade on {trade.order_time} with asset {trade.underlying_asset} is a duplicate.")
-            # Log the duplicate trades for debugging
-            
-        else:
-            print(f"Duplicate check: Trade on {trade.order_time} with asset {trade.underlying_asset} is not a duplicate.")
 
-        return is_duplicate
+class BloFinHandler:
+    def __init__(self, covered_ranges=None, watermarks=None):
+        # Order time span of the rows seen so far, recorded with the upload,
+        # overall and for each symbol
+        self.covered_from = None
+        self.covered_to = None
+        self.covered_symbols = {}
+        # Rows skipped as already synced by an earlier upload
+        self.synced_count = 0
+
+        # Rows older than their symbol's high-water mark, less a window for
+        # late-arriving fills, were already synced and are dropped outright
+        overlap = timedelta(hours=settings.UPLOAD_WATERMARK_OVERLAP_HOURS)
+        self.cutoffs = {
+            symbol: watermark - overlap for symbol, watermark in (watermarks or {}).items()}
+
+        self.set_covered_ranges(covered_ranges or {})
+
+    def set_covered_ranges(self, covered_ranges):
+        """
+        Merge previous uploads' (start, end) order time ranges for lookup.
+
+        `covered_ranges` maps each symbol to the ranges in which uploads
+        stored its rows. A symbol that was disabled, or missing from an
+        export, has no range for that time and so is never skipped.
+        """
+        self.covered = {}
+        for symbol, ranges in covered_ranges.items():
+            cutoff = self.cutoffs.get(symbol)
+            merged = []
+            for start, end in sorted(ranges):
+                # The watermark's overlap window is always checked in full
+                if cutoff is not None:
+                    if start >= cutoff:
+                        continue
+                    end = min(end, cutoff)
+                if merged and start <= merged[-1][1]:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+
+            if merged:
+                self.covered[symbol] = (
+                    np.array([pd.Timestamp(start).value for start, _ in merged], dtype='int64'),
+                    np.array([pd.Timestamp(end).value for _, end in merged], dtype='int64'),
+                )
+
+    def is_covered(self, order_time, symbols):
+        """Flag rows whose order time falls inside a range uploaded for their symbol."""
+        inside = np.zeros(len(order_time), dtype=bool)
+        if self.covered:
+            # NaT becomes the smallest int64, which falls before every range
+            values = order_time.to_numpy(dtype='datetime64[ns]').view('int64')
+            symbols = symbols.to_numpy()
+            for symbol, (starts, ends) in self.covered.items():
+                rows = symbols == symbol
+                if not rows.any():
+                    continue
+                position = np.searchsorted(starts, values[rows], side='right') - 1
+                inside[rows] = (position >= 0) & (values[rows] <= ends[position.clip(0)])
+        return pd.Series(inside, index=order_time.index)
+
+    def record_coverage(self, order_time, symbols):
+        """Widen the upload's covered ranges, overall and per symbol, to the given rows."""
+        spans = order_time.groupby(symbols).agg(['min', 'max'])
+        for symbol, chunk_from, chunk_to in zip(spans.index, spans['min'], spans['max']):
+            chunk_from, chunk_to = chunk_from.to_pydatetime(), chunk_to.to_pydatetime()
+            covered = self.covered_symbols.setdefault(symbol, [chunk_from, chunk_to])
+            covered[0], covered[1] = min(covered[0], chunk_from), max(covered[1], chunk_to)
+            if self.covered_from is None or chunk_from < self.covered_from:
+                self.covered_from = chunk_from
+            if self.covered_to is None or chunk_to > self.covered_to:
+                self.covered_to = chunk_to
+
+    def process_frame(self, frame, owner, exchange):
+        """
+        Build trades from a whole CSV DataFrame using column operations.
+
+        Returns the unsaved trades, the number of canceled rows and the
+        number of rows skipped as unsupported or unparseable. Rows below
+        their symbol's watermark or already covered by an earlier upload
+        are added to synced_count instead.
+        """
+        canceled = frame['Status'] == 'Canceled'
+        canceled_count = int(canceled.sum())
+
+        frame = frame[~canceled & frame['Underlying Asset'].isin(enabled_symbols())]
+
+        order_time = convert_column_to_naive_datetime(frame['Order Time'])
+        order_time = order_time.dt.tz_localize(
+            timezone.get_current_timezone(), ambiguous='NaT', nonexistent='NaT')
+
+        synced_count = 0
+        if self.cutoffs:
+            # Symbols without a watermark get NaT, which no order time is below
+            cutoff = pd.to_datetime(frame['Underlying Asset'].map(self.cutoffs), utc=True)
+            recent = ~(order_time < cutoff)
+            synced_count += int((~recent).sum())
+            frame, order_time = frame[recent], order_time[recent]
+
+        leverage = pd.to_numeric(frame['Leverage'], errors='coerce')
+        reduce_only = convert_column_to_boolean(frame['Reduce-only'])
+
+        # Rows the model could not store are dropped before any Decimal work
+        valid = order_time.notna() & leverage.notna() & reduce_only.notna()
+
+        if valid.any():
+            self.record_coverage(order_time[valid], frame['Underlying Asset'][valid])
+
+        # Rows inside an earlier upload's range for their symbol were ingested then
+        covered = valid & self.is_covered(order_time, frame['Underlying Asset'])
+        synced_count += int(covered.sum())
+        valid &= ~covered
+        frame = frame[valid]
+        self.synced_count += synced_count
+        skipped_count = len(canceled) - canceled_count - synced_count - len(frame)
+
+        trades = [
+            TradeUploadBlofin(
+                owner=owner,
+                underlying_asset=underlying_asset,
+                margin_mode=margin_mode,
+                leverage=int(leverage_value),
+                order_time=order_time_value.to_pydatetime(),
+                side=side,
+                avg_fill=avg_fill,
+                price=price,
+                filled_quantity=filled,
+                original_filled_quantity=filled,
+                pnl=pnl,
+                pnl_percentage=pnl_percentage,
+                fee=fee,
+                reduce_only=reduce_only_value,
+                trade_status=trade_status,
+                exchange=exchange,
+                is_open=False,
+                is_matched=False,
+                fingerprint=build_trade_fingerprint(
+                    owner.id, order_time_value, underlying_asset, side, fee, avg_fill),
+            )
+            for (underlying_asset, margin_mode, leverage_value, order_time_value, side,
+                 avg_fill, price, filled, pnl, pnl_percentage, fee,
+                 reduce_only_value, trade_status) in zip(
+                frame['Underlying Asset'],
+                frame['Margin Mode'],
+                leverage[valid],
+                order_time[valid],
+                frame['Side'],
+                convert_column_to_decimal(frame['Avg Fill']),
+                convert_column_to_decimal(frame['Price']),
+                convert_column_to_decimal(frame['Filled']),
+                convert_column_to_decimal(frame['PNL']),
+                convert_column_to_decimal(frame['PNL%']),
+                convert_column_to_decimal(frame['Fee']),
+                reduce_only[valid],
+                frame['Status'],
+            )
+        ]
 
+        return trades, canceled_count, skipped_count
 
-class BloFinHandler:
     def process_row(self, row, owner, exchange):
+        """Build one trade from a CSV row, the reference process_frame is tested against."""
         duplicates = []
         try:
             # Extract fields from the row
@@ -112,7 +303,7 @@ class BloFinHandler:
             # if underlying_asset in excluded_assets:
             #     return None
 
-            if underlying_asset not in ['ARBUSDT', 'BTCUSDT', 'ETHUSDT', 'RUNEUSDT', 'INJUSDT', 'VRAUSDT', 'LDOUSDT','WIFUSDT', 'SOLUSDT', 'BLURUSDT', 'MATICUSDT', 'SEIUSDT', 'NEARUSDT' ]:
+            if underlying_asset not in enabled_symbols():
                 return None
 
             avg_fill = convert_to_decimal(row['Avg Fill'])
@@ -151,45 +342,6 @@ class BloFinHandler:
             else:
                 price = price
 
-            # Define the tolerance level
-            TOLERANCE = Decimal('0.0001')
-
-            # Create a query to find duplicates within the tolerance range
-            duplicate_queryset = TradeUploadBlofin.objects.filter(
-                order_time=order_time,
-                underlying_asset=underlying_asset,
-                fee=fee
-            ).filter(
-                Q(avg_fill__lte=avg_fill +
-                  TOLERANCE) & Q(avg_fill__gte=avg_fill - TOLERANCE)
-            )
-
-            if duplicate_queryset.exists():
-                duplicate_count = 0
-
-                # Iterate over the duplicate queryset
-                for idx, duplicate in enumerate(duplicate_queryset):
-                    duplicate_count += 1
-
-                    # Print the count of duplicates
-                    print("Count of duplicates:", duplicate_count)
-
-                    # If there are more than one duplicate
-                    if duplicate_count > 1:
-                        # Get all but the first duplicate
-                        excess_duplicates = duplicate_queryset[1:]
-
-                        #
-
-                        # Delete the excess duplicates
-                        excess_duplicates.delete()
-
-                        # Since we only need to handle the first duplicate case,
-                        # we can break the loop after processing excess duplicates
-                        break
-
-                return None
-
             trade_upload_csv = TradeUploadBlofin(
                 owner=owner,
                 underlying_asset=underlying_asset,
@@ -223,93 +375,61 @@ class TradeUpdater:
 
     def update_trade_prices_on_upload(self):
         """Update prices and calculate PnL and percentage for all open trades."""
-        open_trades = TradeUploadBlofin.objects.filter(
-            is_open=True, owner=self.owner).order_by('order_time')
+        open_trades = list(TradeUploadBlofin.objects.filter(
+            is_open=True, owner=self.owner).order_by('order_time'))
 
-      
-
-        api_request_count = 0
+        # One cache lookup, and at most one batched request, covers every open trade
+        current_prices = self.fetch_current_prices(
+            {trade.underlying_asset for trade in open_trades})
 
+        priced_trades = []
         for trade in open_trades:
-            try:
-                symbol = trade.underlying_asset
-                current_price_data = fetch_quote(symbol)
-                api_request_count += 1
-
-                current_price = Decimal('0.0')
-                if current_price_data:
-                    current_price = Decimal(
-                        current_price_data[0].get('price', '0.0'))
-
-                trade.price = current_price
-
-                avg_fill = trade.avg_fill
-                leverage = trade.leverage
-                # long_short = trade.side
-                filled_quantity = trade.filled_quantity
-
-                try:
-                    pnl_percentage, pnl = calculate_trade_pnl_and_percentage(
-                        current_price, avg_fill, leverage, long_short, filled_quantity
-                    )
-                except DivisionByZero:
-                  
-                    pnl_percentage, pnl = Decimal('0.0'), Decimal('0.0')
-
-                trade.pnl_percentage = pnl_percentage
-                trade.pnl = pnl
+            if trade.underlying_asset in current_prices:
+                self.set_trade_price(trade, current_prices[trade.underlying_asset])
+                priced_trades.append(trade)
 
-                trade.save()
-                # logger.debug(f"Updated trade: {trade.id}, price: {
-                #              current_price}, PnL: {pnl}, PnL %: {pnl_percentage}")
+        self.save_trade_prices(priced_trades)
 
-            except Exception as e:
-                print(
-                    f"Error updating trade prices for symbol {symbol}: {e}")
+    def update_trade_prices_by_page(self, owner, page=1, symbols=None):
+        """
+        Update prices and calculate PnL and percentage for trades on a specific page.
 
-    def update_trade_prices_by_page(self, owner, page=1, symbols=[]):
-        """Update prices and calculate PnL and percentage for trades on a specific page."""
+        Only trades in `symbols` are priced when it is given.
+        """
         open_trades = TradeUploadBlofin.objects.filter(
             is_open=True, owner=self.owner).order_by('order_time')
 
         paginator = Paginator(open_trades, per_page=10)
         try:
-            paginated_trades = paginator.get_page(page)
-            symbols_by_page = {
-                trade.underlying_asset for trade in paginated_trades}
-           
-        except EmptyPage:
-            print(f"Page {page} is empty.")
+            paginated_trades = paginator.page(page)
+        except (EmptyPage, PageNotAnInteger):
+            logger.info(f"Page {page} of open trades is empty.")
             return
 
-        # Fetch live prices for the symbols on the current page
-        current_prices = {}
-        for symbol in symbols_by_page:
-            if symbol not in symbols:
-                continue
-
-           
-            current_price_data = fetch_quote(symbol)
+        symbols_by_page = {trade.underlying_asset for trade in paginated_trades}
+        if symbols is not None:
+            symbols_by_page &= set(symbols)
 
-            if current_price_data:
-                current_price = Decimal(
-                    current_price_data[0].get('price', '0.0'))
-                current_prices[symbol] = current_price
-             
-            else:
-                current_prices[symbol] = Decimal('0.0')
-            
+        # Fetch live prices for the symbols on the current page
+        current_prices = self.fetch_current_prices(symbols_by_page)
 
         # Update trades with the fetched prices
+        updated_trades = []
         for trade in paginated_trades:
             if trade.underlying_asset in current_prices:
-                self.update_trade(
+                self.set_trade_price(
                     trade, current_prices[trade.underlying_asset])
+                updated_trades.append(trade)
 
-       
+        self.save_trade_prices(updated_trades)
 
-    def update_trade(self, trade, current_price):
-        """Update trade attributes based on the current price and save."""
+    def fetch_current_prices(self, symbols):
+        """Decimal price for each symbol a quote came back for."""
+        quotes = get_quotes(symbols)
+        return {symbol: Decimal(str(quotes[symbol])) for symbol in symbols if symbol in quotes}
+
+    def set_trade_price(self, trade, current_price):
+        """Set the trade's price and the PnL and percentage it implies, without saving."""
         avg_fill = trade.avg_fill
         leverage = trade.leverage
         long_short = trade.side
@@ -326,6 +446,15 @@ class TradeUpdater:
         trade.price = current_price
         trade.pnl_percentage = pnl_percentage
         trade.pnl = pnl
+
+    def save_trade_prices(self, trades):
+        TradeUploadBlofin.objects.bulk_update(
+            trades, ['price', 'pnl_percentage', 'pnl'],
+            batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE)
+
+    def update_trade(self, trade, current_price):
+        """Update trade attributes based on the current price and save."""
+        self.set_trade_price(trade, current_price)
         trade.save()
         # logger.debug(f"Updated trade: {trade.id}, price: {
         #              current_price}, PnL: {pnl}, PnL %: {pnl_percentage}")
@@ -1,19 +1,20 @@
-import json
-from django.utils import timezone
-from django.db.models import F, Sum, Case, When, IntegerField
-from upload_csv.models import TradeUploadBlofin, LiveTrades
-from upload_csv.api_handler.fmp_api import fetch_quote
+from django.db.models import F, Q, Count, Sum, Case, When, IntegerField, OuterRef, Subquery
+from upload_csv.models import TradeUploadBlofin, LiveTrades, MatcherCheckpoint, TradeMatch
+from upload_csv.api_handler.quote_cache import get_quotes
+from historical_datasets.realized_pnl import emit_historical_pnl
+from upload_csv.calculations.fifo_matching import new_lot, match_fifo_vectorized, fifo_split, fifo_fills, fixed_point_places, to_fixed_point, dump_open_lots, load_open_lots
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 from decimal import Decimal
-# import logging
+import logging
 
+logger = logging.getLogger(__name__)
 
-# logger = logging.getLogger(__name__)
-# logger.setLevel(logging.INFO)
-# handler = logging.StreamHandler()
-# handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-# logger.addHandler(handler)
 
+def at_or_before(order_time, trade_id):
+    """Trades up to and including a position in (order_time, id) order."""
+    return Q(order_time__lt=order_time) | Q(order_time=order_time, id__lte=trade_id)
 
 
 class TradeMatcherProcessor:
@@ -24,137 +25,250 @@ class TradeMatcherProcessor:
         self.trades_by_asset = {}
 
     def process_assets(self, asset_name):
-        # Process each asset and its trades
-        self.revert_filled_quantity_values(asset_name)
-        self.process_asset_match(asset_name)
-        # Additional processing can be done here
-
-    def revert_filled_quantity_values(self, asset_name):
-        """Revert all trades' filled_quantity values to their original_filled_quantity before processing."""
+        # Process each asset and its trades, never leaving it half reset.
+        # Only trades after the checkpoint need matching, unless a trade
+        # was inserted before it, in which case the asset is rebuilt.
+        # Returns the quantity of buys left open.
         with transaction.atomic():
-            trades = TradeUploadBlofin.objects.filter(
-                owner=self.owner,
-                underlying_asset=asset_name
-            )
+            checkpoint = MatcherCheckpoint.objects.select_for_update().filter(
+                owner=self.owner, asset=asset_name).first()
 
-            if not trades.exists():
-                print(f"No trades found for asset {asset_name}. Skipping revert.")
-                return
+            if checkpoint and self.checkpoint_is_current(checkpoint):
+                return self.process_asset_match(asset_name, checkpoint)
+            return self.rebuild_asset(asset_name)
 
-            for trade in trades:
-                original_value = trade.original_filled_quantity
-                if original_value is None:
-                    print(f"Trade ID={trade.id} does not have an original_filled_quantity. Skipping revert.")
-                    continue
+    def rebuild_asset(self, asset_name):
+        """Rematch an asset's whole history from scratch, returning its open quantity."""
+        with transaction.atomic():
+            # The ledger is rewritten along with the matching it records
+            TradeMatch.objects.filter(owner=self.owner, asset=asset_name).delete()
+            self.revert_filled_quantity_values(asset_name)
+            return self.process_asset_match(asset_name)
 
-                try:
-                    # Log the before value
-                    # logger.info(f"Before: Trade ID={trade.id} was {trade.filled_quantity}, reverting to {original_value}.")
+    def asset_trades(self, asset_name):
+        return TradeUploadBlofin.objects.filter(
+            owner=self.owner,
+            underlying_asset=asset_name,
+            side__in=['Buy', 'Sell'],
+        )
 
-                    # Update the trade
-                    TradeUploadBlofin.objects.filter(id=trade.id).update(
-                        filled_quantity=original_value,
-                        is_open=False,
-                        is_matched=False,
-                        is_partially_matched=False,
-                    )
+    def checkpoint_is_current(self, checkpoint):
+        """True if no trade was added at or before the checkpoint since it was saved."""
+        trades_before = self.asset_trades(checkpoint.asset).filter(
+            at_or_before(checkpoint.last_order_time, checkpoint.last_trade_id)
+        ).count()
+        return trades_before == checkpoint.trade_count
 
-                    # Log the after value
-                    updated_trade = TradeUploadBlofin.objects.get(id=trade.id)
-                    # logger.info(f"Reverted trade ID={updated_trade.id} to {updated_trade.filled_quantity}.")
+    def revert_filled_quantity_values(self, asset_name):
+        """Revert all trades' filled_quantity values to their original_filled_quantity before processing."""
+        trades = TradeUploadBlofin.objects.filter(
+            owner=self.owner,
+            underlying_asset=asset_name
+        )
 
-                except Exception as e:
-                    print(f"Failed to revert trade ID={trade.id}. Error: {e}")
+        counts = trades.aggregate(
+            total=Count('id'),
+            missing_original=Count('id', filter=Q(original_filled_quantity__isnull=True)),
+        )
+        if not counts['total']:
+            logger.info(f"No trades found for asset {asset_name}. Skipping revert.")
+            return
+
+        if counts['missing_original']:
+            logger.warning(f"{counts['missing_original']} trades for asset {asset_name} do not have an original_filled_quantity. Skipping revert for them.")
+
+        # One UPDATE resets the whole asset
+        trades.filter(original_filled_quantity__isnull=False).update(
+            filled_quantity=F('original_filled_quantity'),
+            is_open=False,
+            is_matched=False,
+            is_partially_matched=False,
+        )
 
+    def process_asset_match(self, asset_name, checkpoint=None):
+        logger.debug(f"Processing asset update for: {asset_name}")
+
+        if checkpoint is None:
+            qty_sum = self.match_asset_in_bulk(asset_name)
+            if qty_sum is not None:
+                return qty_sum
+
+        trades = self.asset_trades(asset_name)
+        buy_status, sell_status = [], []
+
+        if checkpoint:
+            # Resume from the saved queues, loading just the open lots and
+            # the trades that came after the checkpoint
+            buy_status = load_open_lots(checkpoint.open_buys)
+            sell_status = load_open_lots(checkpoint.open_sells)
+            open_ids = {lot['id'] for lot in buy_status + sell_status}
+            trades = trades.filter(
+                Q(id__in=open_ids)
+                | ~at_or_before(checkpoint.last_order_time, checkpoint.last_trade_id)
+            )
+        else:
+            open_ids = set()
 
-    def process_asset_match(self, asset_name):
-        print(f"Processing asset update for: {asset_name}")
+        # Load the trades once, oldest first, and match them in memory
+        trades = list(trades.order_by('order_time', 'id').only(
+            'id', 'order_time', 'side', 'avg_fill', 'filled_quantity', 'is_matched', 'is_partially_matched', 'is_open'))
+        new_trades = [trade for trade in trades if trade.id not in open_ids]
 
-        # Filter trades for the specified asset and owner
-        trades = TradeUploadBlofin.objects.filter(
-            owner=self.owner,
-            underlying_asset=asset_name,
-        )
+        buy_status += [new_lot(trade.id, trade.filled_quantity) for trade in new_trades if trade.side == 'Buy']
+        sell_status += [new_lot(trade.id, trade.filled_quantity) for trade in new_trades if trade.side == 'Sell']
+        fills = []
+        match_fifo_vectorized(buy_status, sell_status, fills)
+
+        with transaction.atomic():
+            # Update the TradeUploadBlofin model
+            self.update_trade_status(trades, buy_status + sell_status)
+            self.record_matches(asset_name, fills, {
+                trade.id: (trade.order_time, trade.avg_fill) for trade in trades})
 
-        # Separate trades into buys and sells
-        buys = list(trades.filter(side='Buy').values_list('id', 'filled_quantity'))
-        sells = list(trades.filter(side='Sell').values_list('id', 'filled_quantity'))
-
-        # Convert to dictionaries for easier matching
-        buy_status = [{'id': buy[0], 'value': buy[1], 'is_matched': False, 'is_partially_matched': False, 'is_open': True} for buy in buys]
-        sell_status = [{'id': sell[0], 'value': sell[1], 'is_matched': False, 'is_partially_matched': False, 'is_open': True}  for sell in sells]
-
-        i = 0  # Pointer for `buys`
-        while i < len(buy_status) and sell_status:
-            if buy_status[i]['value'] >= sell_status[0]['value']:
-                buy_status[i]['value'] -= sell_status[0]['value']
-                sell_status[0]['value'] = 0
-
-                # Ensure the sell is marked as matched before removal
-                sell_status[0]['is_matched'] = True
-                sell_status[0]['is_open'] = False
-                self.update_trade_status(sell_status)
-                sell_status.pop(0)
-                
-                if buy_status[i]['value'] == 0:
-                    buy_status[i]['is_matched'] = True
-                    buy_status[i]['is_open'] = False
-                    buy_status[i]['is_partially_matched'] = False
-                else:
-                    buy_status[i]['is_partially_matched'] = True
-            else:
-                sell_status[0]['value'] -= buy_status[i]['value']
-                buy_status[i]['value'] = 0
-                buy_status[i]['is_matched'] = True
-                buy_status[i]['is_open'] = False
-                buy_status[i]['is_partially_matched'] = False
-            
-            if buy_status[i]['value'] == 0:
-                i += 1
-
-
-        # Update the TradeUploadBlofin model
-        self.update_trade_status(buy_status)
-        self.update_trade_status(sell_status)
+            last_trade = (new_trades[-1].order_time, new_trades[-1].id) if new_trades else None
+            self.save_checkpoint(asset_name, checkpoint, last_trade, len(new_trades), buy_status, sell_status)
 
         # Calculate the total quantity of open buys
-        qty_sum = sum(round(item['value'], 10) for item in buy_status if item['is_open'])
+        return sum((round(item['value'], 10) for item in buy_status if item['is_open']), Decimal(0))
+
+    def match_asset_in_bulk(self, asset_name):
+        """
+        Match a whole, freshly reverted history with a few range UPDATEs.
+
+        FIFO fully matches the oldest lots on each side, splits at most one
+        and leaves the rest open, so once fifo_split() has found the split
+        points nothing needs writing one trade at a time. Returns the open
+        quantity, or None without writing anything when the quantities need
+        the reference loop.
+        """
+        trades = self.asset_trades(asset_name)
+        rows = list(trades.order_by('order_time', 'id').values_list(
+            'id', 'order_time', 'side', 'filled_quantity', 'avg_fill'))
+
+        places = fixed_point_places(row[3] for row in rows)
+        if places is None:
+            return None
+
+        sides = {}
+        for side in ('Buy', 'Sell'):
+            side_rows = [row for row in rows if row[2] == side]
+            quantities = to_fixed_point([row[3] for row in side_rows], places)
+            if quantities is None:
+                return None
+            sides[side] = (side_rows, quantities)
+
+        splits = fifo_split(sides['Buy'][1], sides['Sell'][1])
+        open_lots = {}
+
+        with transaction.atomic():
+            for (side, (side_rows, quantities)), (fully_matched, remainder) in zip(sides.items(), splits):
+                side_trades = trades.filter(side=side)
+                open_lots[side] = [new_lot(row[0], row[3]) for row in side_rows[fully_matched:]]
+
+                if fully_matched:
+                    trade_id, order_time = side_rows[fully_matched - 1][:2]
+                    side_trades.filter(at_or_before(order_time, trade_id)).update(
+                        filled_quantity=0, is_matched=True, is_open=False, is_partially_matched=False)
 
-        # print(f"Final state after processing:")
-        # print(f"Buys status: {buy_status}")
-        # print(f"Sells remaining: {sell_status}")
-        # print(f"Total quantity of open buys: {qty_sum}")
+                if remainder is None:
+                    continue
 
-        # Update live trades
-        self.update_live_trades(asset_name, qty_sum)
+                trade_id, order_time = side_rows[fully_matched][:2]
+                side_trades.filter(~at_or_before(order_time, trade_id) | Q(id=trade_id)).update(
+                    is_matched=False, is_open=True, is_partially_matched=False)
 
-    def update_trade_status(self, buy_status):
-        for buy in buy_status:
-            trade = TradeUploadBlofin.objects.get(id=buy['id'])
-            trade.is_matched = buy['is_matched']
-            trade.is_partially_matched = buy['is_partially_matched']
-            trade.is_open = buy['is_open']
-            trade.save()
+                # The lot the matching stopped in keeps only what is left of it
+                if remainder < quantities[fully_matched]:
+                    lot = open_lots[side][0]
+                    lot['value'] = Decimal(remainder).scaleb(-places)
+                    lot['is_partially_matched'] = side == 'Buy'
+                    side_trades.filter(id=trade_id).update(
+                        filled_quantity=lot['value'], is_partially_matched=lot['is_partially_matched'])
 
-    def update_live_trades(self, asset_name, qty_sum):
-        # Determine if the asset is considered live
-        is_live = qty_sum > 0
+            buy_rows, sell_rows = sides['Buy'][0], sides['Sell'][0]
+            fills = [
+                (buy_rows[buy_index][0], sell_rows[sell_index][0], Decimal(int(quantity)).scaleb(-places))
+                for buy_index, sell_index, quantity in zip(*fifo_fills(sides['Buy'][1], sides['Sell'][1]))
+            ]
+            self.record_matches(asset_name, fills, {row[0]: (row[1], row[4]) for row in rows})
 
-        # print(f"Updating LiveTrades with qty_sum: {qty_sum} and is_live: {is_live}")
+            last_trade = (rows[-1][1], rows[-1][0]) if rows else None
+            self.save_checkpoint(asset_name, None, last_trade, len(rows), open_lots['Buy'], open_lots['Sell'])
 
-        # Update or create LiveTrades entries
-        LiveTrades.objects.update_or_create(
+        # Calculate the total quantity of open buys
+        return sum((lot['value'] for lot in open_lots['Buy']), Decimal(0))
+
+    def record_matches(self, asset_name, fills, trade_info):
+        """
+        Add (buy id, sell id, quantity) fills to the match ledger.
+
+        The earlier trade, in (order_time, id) order, opened the lot and the
+        later one closed it, so a short opens with its sell.
+        """
+        matches = []
+        for buy_id, sell_id, quantity in fills:
+            buy_time, buy_price = trade_info[buy_id]
+            sell_time, sell_price = trade_info[sell_id]
+            opening, closing = sorted([(buy_time, buy_id, buy_price), (sell_time, sell_id, sell_price)])
+            opened_at, _, entry_price = opening
+            closed_at, _, exit_price = closing
+            matches.append(TradeMatch(
+                owner=self.owner,
+                asset=asset_name,
+                buy_trade_id=buy_id,
+                sell_trade_id=sell_id,
+                quantity=quantity,
+                entry_price=entry_price,
+                exit_price=exit_price,
+                opened_at=opened_at,
+                closed_at=closed_at,
+                realized_pnl=((sell_price - buy_price) * quantity).quantize(Decimal('1E-10')),
+            ))
+
+        TradeMatch.objects.bulk_create(
+            matches, batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE)
+
+    def save_checkpoint(self, asset_name, checkpoint, last_trade, new_trade_count, buy_status, sell_status):
+        """Record the open FIFO queues as of the last (order_time, id) matched."""
+        if last_trade is None:
+            if checkpoint is None:
+                MatcherCheckpoint.objects.filter(owner=self.owner, asset=asset_name).delete()
+            return
+
+        trade_count = new_trade_count + (checkpoint.trade_count if checkpoint else 0)
+        MatcherCheckpoint.objects.update_or_create(
             owner=self.owner,
             asset=asset_name,
             defaults={
-                'is_live': is_live,
-                'total_quantity': qty_sum
+                'last_order_time': last_trade[0],
+                'last_trade_id': last_trade[1],
+                'trade_count': trade_count,
+                'open_buys': dump_open_lots(buy_status),
+                'open_sells': dump_open_lots(sell_status),
             }
         )
 
-        # Verify that the update was successful
-        live_trade = LiveTrades.objects.get(owner=self.owner, asset=asset_name)
-        # print(f"Updated LiveTrades: {live_trade.total_quantity}, is_live: {live_trade.is_live}")
+    def update_trade_status(self, trades, statuses):
+        """Write back only the trades whose matching state changed, in bulk."""
+        status_by_id = {status['id']: status for status in statuses}
+        changed_trades = []
+
+        for trade in trades:
+            status = status_by_id[trade.id]
+            if (trade.is_matched, trade.is_partially_matched, trade.is_open, trade.filled_quantity) == (
+                    status['is_matched'], status['is_partially_matched'], status['is_open'], status['value']):
+                continue
+            trade.is_matched = status['is_matched']
+            trade.is_partially_matched = status['is_partially_matched']
+            trade.is_open = status['is_open']
+            trade.filled_quantity = status['value']
+            changed_trades.append(trade)
+
+        TradeUploadBlofin.objects.bulk_update(
+            changed_trades,
+            ['is_matched', 'is_partially_matched', 'is_open', 'filled_quantity'],
+            batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE,
+        )
 
 
 class TradeIdMatcher:
@@ -162,109 +276,104 @@ class TradeIdMatcher:
         self.owner = owner
         # print("TradeIdMatcher initialized.")
 
-    def check_trade_ids(self):
+    def check_trade_ids(self, parallelism=None):
         # print("Checking ids")
 
-        # Fetch trades for the given owner
-        trades = TradeUploadBlofin.objects.filter(owner=self.owner)
-        # print("             ")
-        # print(f"Fetched {trades.count()} trades for owner {self.owner}")
-        # print("             ")
+        pending_trade_counts = self.pending_trade_counts()
 
-        # Dictionary to hold asset IDs and associated trades
-        asset_ids = {}
+        for asset, count in pending_trade_counts.items():
+            logger.debug(f"Asset: {asset}, New trades: {count}")
 
-        # Iterate through trades and group by underlying asset
-        for trade in trades:
-            asset = trade.underlying_asset
-            if asset:
-                if asset not in asset_ids:
-                    asset_ids[asset] = []
-                asset_ids[asset].append(trade.id)
-
-        print("Assets and their trade IDs:")
-        print("             ")
-        for asset, ids in asset_ids.items():
-            print(f"Asset: {asset}, Trade IDs: {ids}")
-            print("             ")
-
-        # Check these IDs in the LiveTrades model
-        for asset, ids in asset_ids.items():
-            # Fetch or create LiveTrades entry for the given owner and asset
-            try:
-                live_trade = LiveTrades.objects.get(
-                    owner=self.owner, asset=asset)
-                print("             ")
-                print(f"Found LiveTrades for asset: {asset}")
-                print("             ")
-
-                # Parse existing trade_ids field from JSON string to a Python list
-                existing_trade_ids = json.loads(live_trade.trade_ids)
-                print("             ")
-                print(f"Existing trade IDs for asset {
-                      asset}: {existing_trade_ids}")
-                print("             ")
-
-                # Determine new IDs to be added
-                new_ids = set(ids) - set(existing_trade_ids)
-                print("             ")
-                print(f"New trade IDs to add for asset {asset}: {new_ids}")
-                print("             ")
-
-                # Update if there are new IDs
-                if new_ids:
-                    self.put(asset, list(new_ids), live_trade)
-
-            except LiveTrades.DoesNotExist:
-                # If no LiveTrades entry exists for this asset, create a new one
-                print("             ")
-                print(f"No existing LiveTrades entry for asset {
-                      asset}. Creating new entry.")
-                print("             ")
-                self.put(asset, ids)
-
-        return asset_ids
-        
-
-    def put(self, asset_name, new_trade_ids, live_trade=None):
-        # Fetch or create LiveTrades entry for the asset
-        quote_data = fetch_quote(asset_name)
-        live_price = quote_data[0]['price'] if quote_data else 0
-
-        if live_trade:
-            # Parse current trade_ids and update with new trade IDs
-            current_trade_ids = json.loads(live_trade.trade_ids)
-            updated_trade_ids = list(set(current_trade_ids) | set(
-                new_trade_ids))  # Union of current and new IDs
-
-            # Update the LiveTrades entry
-            live_trade.trade_ids = json.dumps(updated_trade_ids)
-            live_trade.live_price = live_price
-            live_trade.last_updated = timezone.now()  # Update the timestamp
-            live_trade.save()
-            # print("             ")
-            # print(f"Updated LiveTrades for asset {
-            #       asset_name} with new trade IDs.")
-            # print("             ")
+        self.reconcile(pending_trade_counts, parallelism=parallelism)
+        return pending_trade_counts
 
-        else:
-            # Create a new LiveTrades entry
-            live_trade = LiveTrades(
-                owner=self.owner,
-                asset=asset_name,
-                total_quantity=0,  # Set to 0 or any default value
-                long_short="LONG",
-                live_price=live_price,
-                trade_ids=json.dumps(new_trade_ids),
-                last_updated=timezone.now(),
+    def pending_trade_counts(self):
+        """Number of trades per asset not yet linked to a LiveTrades entry."""
+        return dict(
+            TradeUploadBlofin.objects.filter(owner=self.owner, live_trade__isnull=True)
+            .exclude(underlying_asset='')
+            .order_by('underlying_asset')
+            .values_list('underlying_asset')
+            .annotate(new_trades=Count('id'))
+        )
 
+    def reconcile(self, trade_counts, parallelism=None, rebuild=False):
+        """
+        Match the given assets and bring their positions up to date in one pass.
+
+        `trade_counts` maps each asset to the number of trades it has to
+        match. Quotes come from the quote cache, and the positions are
+        written and the new trades linked to them with one statement each,
+        however many assets there are. Returns each asset's open quantity.
+        """
+        if not trade_counts:
+            return {}
+
+        live_prices = get_quotes(trade_counts)
+
+        # Imported here to avoid a circular import, the coordinator's
+        # workers call back into this matcher
+        from upload_csv.jobs.matching_coordinator import MatchingCoordinator
+
+        # Assets don't depend on each other, so they are matched side by side
+        results = MatchingCoordinator(parallelism).run(
+            [(self.owner.id, asset) for asset in trade_counts],
+            rebuild=rebuild,
+            sizes={(self.owner.id, asset): count for asset, count in trade_counts.items()},
+        )
+
+        save_positions(results, live_prices)
+        emit_historical_pnl([self.owner.id])
+        # Trades are linked last, so a failed match leaves them pending
+        link_trades([self.owner.id], trade_counts)
+
+        return {asset: total_quantity for _, asset, total_quantity in results}
+
+
+def save_positions(results, live_prices=None):
+    """
+    Upsert the LiveTrades entry of every matched (owner_id, asset, open quantity).
+
+    Live prices, keyed by asset, are written for the assets they quote.
+    Assets without a quote keep the price they had, and new ones start
+    without a price, so a missed quote never shows up as a price of 0.
+    """
+    live_prices = live_prices or {}
+    priced_at = timezone.now()
+    priced, unpriced = [], []
+    for owner_id, asset, total_quantity in results:
+        live_trade = LiveTrades(
+            owner_id=owner_id,
+            asset=asset,
+            total_quantity=total_quantity,
+            is_live=total_quantity > 0,
+            long_short="LONG",
+        )
+        if asset in live_prices:
+            live_trade.live_price = live_prices[asset]
+            live_trade.price_updated_at = priced_at
+            priced.append(live_trade)
+        else:
+            unpriced.append(live_trade)
+
+    update_fields = ['total_quantity', 'is_live', 'last_updated']
+    for live_trades, fields in ((priced, update_fields + ['live_price', 'price_updated_at']), (unpriced, update_fields)):
+        if live_trades:
+            LiveTrades.objects.bulk_create(
+                live_trades,
+                update_conflicts=True,
+                unique_fields=['owner', 'asset'],
+                update_fields=fields,
+                batch_size=settings.UPLOAD_CSV_BULK_BATCH_SIZE,
             )
-            live_trade.save()
-            # print("             ")
-            # print(f"Created new LiveTrades entry for asset {
-            #       asset_name} with trade IDs: {new_trade_ids}")
-            # print("             ")
-
-        # Pass the asset name to TradeMatcherProcessor
-        processor = TradeMatcherProcessor(owner=self.owner)
-        processor.process_assets(asset_name)
+
+
+def link_trades(owner_ids, assets):
+    """Point the unlinked trades of the given owners and assets at their LiveTrades entry."""
+    TradeUploadBlofin.objects.filter(
+        owner_id__in=owner_ids, underlying_asset__in=list(assets), live_trade__isnull=True
+    ).update(live_trade=Subquery(
+        LiveTrades.objects.filter(
+            owner=OuterRef('owner'), asset=OuterRef('underlying_asset')
+        ).values('id')[:1]
+    ))
@@ -1,7 +1,8 @@
-import requests
 from django.utils import timezone  # Ensure you have this import
+from django.db.models import Case, When, Value, DecimalField
 from upload_csv.models import LiveTrades
-from upload_csv.api_handler.fmp_api import fetch_quote
+from upload_csv.api_handler.quote_cache import get_quotes, refresh_quotes_once
+from decimal import Decimal
 # import logging
 
 # Configure logging
@@ -11,17 +12,29 @@ from upload_csv.api_handler.fmp_api import fetch_quote
 
 class LiveTradeUpdater():
 
-    def update_live_prices_for_live_trades(self):
+    def update_live_prices_for_live_trades(self, refresh=False):
         """
-        Updates the live prices for all LiveTrades entries.
+        Updates the live prices of the LiveTrades entries still live.
+
+        Each distinct live asset is quoted once, through the shared quote cache,
+        or fetched again with `refresh`, which refills the cache too and
+        shares fetches already in flight. Every row is written by a single
+        UPDATE. Rows whose asset got no quote keep their last price and
+        price_updated_at.
+        Returns the number of rows updated.
         """
-        trades = LiveTrades.objects.all()
-        
-        for trade in trades:
-            quote_data = fetch_quote(trade.asset)
-            live_price = quote_data[0]['price'] if quote_data else 0
-            
-            trade.live_price = live_price
-            trade.last_updated = timezone.now()  # Update the timestamp
-            trade.save()
-            # logger.info(f"Updated LiveTrades for asset {trade.asset} with new live price: {live_price}")
\ No newline at end of file
+        live_trades = LiveTrades.objects.filter(is_live=True)
+        assets = set(live_trades.order_by().values_list('asset', flat=True).distinct())
+        live_prices = refresh_quotes_once(assets) if refresh else get_quotes(assets)
+        if not live_prices:
+            return 0
+
+        updated = live_trades.filter(asset__in=live_prices).update(
+            live_price=Case(
+                *[When(asset=asset, then=Value(Decimal(str(price)))) for asset, price in live_prices.items()],
+                output_field=DecimalField(max_digits=20, decimal_places=10),
+            ),
+            price_updated_at=timezone.now(),
+        )
+        # logger.info(f"Updated live prices for {updated} LiveTrades")
+        return updated
@@ -0,0 +1,2 @@
+from upload_csv.jobs.upload_job_runner import enqueue_upload_job, run_upload_job, fail_stale_upload_jobs
+from upload_csv.jobs.matching_coordinator import MatchingCoordinator, match_asset
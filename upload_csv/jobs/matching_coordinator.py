@@ -0,0 +1,77 @@
+from upload_csv.exchange.blofin_trade_matcher import TradeMatcherProcessor
+from concurrent.futures import ProcessPoolExecutor
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import close_old_connections, connection
+import multiprocessing
+import logging
+import django
+
+logger = logging.getLogger(__name__)
+
+
+def match_asset(owner_id, asset_name, rebuild=False):
+    """Match an owner's trades for an asset and return its open quantity."""
+    processor = TradeMatcherProcessor(owner=User(id=owner_id))
+    if rebuild:
+        total_quantity = processor.rebuild_asset(asset_name)
+    else:
+        total_quantity = processor.process_assets(asset_name)
+    return owner_id, asset_name, total_quantity
+
+
+def _match_in_worker(owner_id, asset_name, rebuild=False):
+    # Pool workers keep their connection between tasks, drop it if it went bad
+    close_old_connections()
+    return match_asset(owner_id, asset_name, rebuild=rebuild)
+
+
+class MatchingCoordinator:
+    """
+    Match many (owner, asset) pairs, spread over a pool of processes.
+
+    Assets never share trades, ledger rows or checkpoints, so they can be
+    matched in any order and on any worker with the same outcome. Results
+    come back sorted by owner and asset; writing the positions they imply
+    is left to the caller, so it can be done in bulk.
+    """
+
+    def __init__(self, parallelism=None):
+        self.parallelism = parallelism or settings.MATCHING_PARALLELISM
+
+    def run(self, tasks, rebuild=False, sizes=None):
+        """
+        Match each (owner_id, asset_name) task.
+
+        `sizes` maps tasks to the number of trades each has to match.
+        Returns a sorted list of (owner_id, asset_name, total_quantity).
+        """
+        sizes = sizes or {}
+        # Biggest assets first, so a long one doesn't start last
+        tasks = sorted(tasks, key=lambda task: (-sizes.get(task, 0), task))
+
+        # Workers use their own connections and can't see rows that the
+        # caller has not committed yet, so work inside a transaction stays
+        # here. SQLite only allows one writer at a time, so it does too.
+        if (self.parallelism <= 1 or len(tasks) <= 1 or connection.in_atomic_block
+                or connection.vendor == 'sqlite'):
+            results = [match_asset(*task, rebuild=rebuild) for task in tasks]
+        else:
+            results = self.run_in_pool(tasks, rebuild)
+
+        return sorted(results, key=lambda result: (result[0], result[1]))
+
+    def run_in_pool(self, tasks, rebuild):
+        logger.info(f"Matching {len(tasks)} assets on {self.parallelism} processes.")
+        with ProcessPoolExecutor(
+            max_workers=min(self.parallelism, len(tasks)),
+            # Spawned workers start from a clean interpreter, set Django up
+            # before the first task is unpickled and open their own connections
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        ) as executor:
+            futures = [
+                executor.submit(_match_in_worker, *task, rebuild=rebuild)
+                for task in tasks
+            ]
+            return [future.result() for future in futures]
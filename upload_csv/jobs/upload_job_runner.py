@@ -0,0 +1,178 @@
+from upload_csv.exchange.blofin import BloFinHandler, CsvProcessor
+from upload_csv.exchange.blofin_trade_matcher import TradeIdMatcher
+from upload_csv.models import UploadJob, UploadWatermark
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+import threading
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process-wide upload worker pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.UPLOAD_JOB_WORKERS,
+                thread_name_prefix='upload-job',
+            )
+    return _executor
+
+
+def enqueue_upload_job(job, file_path):
+    """Run the job on the worker pool, or inline when async jobs are off."""
+    if not settings.UPLOAD_JOBS_ASYNC:
+        run_upload_job(job.id, file_path)
+        return
+
+    try:
+        get_executor().submit(_run_in_worker, job.id, file_path)
+    except Exception as e:
+        # The job never started, so nothing else would remove its file
+        logger.exception(f"Upload job {job.id} could not be queued.")
+        os.remove(file_path)
+        UploadJob.objects.filter(id=job.id).update(
+            status='failed', error=str(e), finished_at=timezone.now())
+        raise
+
+
+def fail_stale_upload_jobs():
+    """
+    Mark jobs whose worker is gone as failed, returning how many there were.
+
+    Jobs run on threads of the process that queued them, so a job whose
+    process died mid-run would stay pending or running forever. A running
+    job whose last heartbeat, and a pending job whose creation, is more
+    than UPLOAD_JOB_STALE_SECONDS ago is failed. Its upload file went with
+    the process, so it can't be queued again; the file has to be uploaded
+    again. A pending job failed here is not started if its worker turns
+    out to be alive after all.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_JOB_STALE_SECONDS)
+    stale_count = UploadJob.objects.alias(
+        last_seen=Coalesce('heartbeat_at', 'started_at', 'created_at'),
+    ).filter(
+        status__in=['pending', 'running'], last_seen__lt=cutoff
+    ).update(
+        status='failed',
+        error="The upload stopped before it finished. Please upload the file again.",
+        finished_at=timezone.now(),
+    )
+    if stale_count:
+        logger.warning(f"Marked {stale_count} stale upload jobs as failed.")
+    return stale_count
+
+
+def _run_in_worker(job_id, file_path):
+    # Worker threads get their own connection, which must not outlive the job
+    close_old_connections()
+    try:
+        fail_stale_upload_jobs()
+        run_upload_job(job_id, file_path)
+    finally:
+        connection.close()
+
+
+def run_upload_job(job_id, file_path):
+    """Parse, dedup and insert an uploaded CSV, then match the new trades."""
+    now = timezone.now()
+    # Only a job still pending is started, not one failed as stale meanwhile
+    if not UploadJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=now, heartbeat_at=now):
+        logger.warning(f"Upload job {job_id} is no longer pending. Skipping it.")
+        os.remove(file_path)
+        return
+    job = UploadJob.objects.select_related('owner').get(id=job_id)
+
+    # Rows below the watermark or inside the order time range an earlier
+    # upload stored for their symbol are skipped, unless a full resync was
+    # asked for
+    covered_ranges = {}
+    watermarks = {}
+    if not job.full_resync:
+        for covered_symbols in UploadJob.objects.filter(
+            owner=job.owner,
+            exchange=job.exchange,
+            status='completed',
+            covered_from__isnull=False,
+        ).exclude(id=job.id).values_list('covered_symbols', flat=True):
+            for symbol, (covered_from, covered_to) in covered_symbols.items():
+                covered_ranges.setdefault(symbol, []).append(
+                    (datetime.fromisoformat(covered_from), datetime.fromisoformat(covered_to)))
+        watermarks = dict(UploadWatermark.objects.filter(
+            owner=job.owner, exchange=job.exchange
+        ).values_list('symbol', 'high_water_mark'))
+
+    handler = BloFinHandler(covered_ranges=covered_ranges, watermarks=watermarks)
+    processor = CsvProcessor(handler)
+
+    # Updates only land while the job is running, never over a stale failure
+    running_job = UploadJob.objects.filter(id=job_id, status='running')
+
+    def on_chunk(rows_parsed, new_trades_count, duplicates_count, canceled_count):
+        running_job.update(
+            rows_parsed=rows_parsed,
+            new_trades_count=new_trades_count,
+            duplicates_count=duplicates_count,
+            canceled_count=canceled_count,
+            synced_count=handler.synced_count,
+            stage_timings=dict(processor.stage_timings),
+            heartbeat_at=timezone.now(),
+        )
+
+    try:
+        with open(file_path, 'rb') as file:
+            new_trades_count, duplicates_count, canceled_count = processor.process_csv_file(
+                file, job.owner, job.exchange, on_chunk=on_chunk)
+
+        if new_trades_count > 0:
+            start_time = time.perf_counter()
+            TradeIdMatcher(job.owner).check_trade_ids()
+            processor.stage_timings['matching'] += time.perf_counter() - start_time
+        else:
+            logger.info("No new trades added. Skipping matching process.")
+
+        for symbol, (_, covered_to) in handler.covered_symbols.items():
+            UploadWatermark.advance(job.owner, job.exchange, symbol, covered_to)
+
+        completed = running_job.update(
+            status='completed',
+            new_trades_count=new_trades_count,
+            duplicates_count=duplicates_count,
+            canceled_count=canceled_count,
+            synced_count=handler.synced_count,
+            stage_timings=dict(processor.stage_timings),
+            covered_from=handler.covered_from,
+            covered_to=handler.covered_to,
+            covered_symbols={
+                symbol: [covered_from.isoformat(), covered_to.isoformat()]
+                for symbol, (covered_from, covered_to) in handler.covered_symbols.items()
+            },
+            finished_at=timezone.now(),
+        )
+        if not completed:
+            logger.warning(f"Upload job {job_id} finished after it was failed as stale.")
+        logger.debug(f"Upload job {job_id} complete. New trades count: {new_trades_count}, Duplicates: {duplicates_count}, Canceled count: {canceled_count}")
+
+    except Exception as e:
+        logger.exception(f"Upload job {job_id} failed.")
+        running_job.update(
+            status='failed',
+            error=str(e),
+            stage_timings=dict(processor.stage_timings),
+            finished_at=timezone.now(),
+        )
+
+    finally:
+        os.remove(file_path)
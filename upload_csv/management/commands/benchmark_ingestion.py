@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from upload_csv.benchmarks.ingestion_benchmark import IngestionBenchmark, compare_to_baseline
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark ingesting, matching and pricing a synthetic BloFin upload. "
+        "Prints a JSON report; nothing is left in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--csv', default=None,
+                            help="Benchmark this CSV instead of generating one.")
+        parser.add_argument('--price-tape', default=None,
+                            help="Replay quotes from this tape instead of generating one.")
+        parser.add_argument('--through-view', action='store_true',
+                            help="Post the file to UploadFileView instead of calling the stages directly.")
+        parser.add_argument('--output', default=None,
+                            help="Also write the report to this file, e.g. to keep as a baseline.")
+        parser.add_argument('--baseline', default=None,
+                            help="Compare against a report written by an earlier --output.")
+        parser.add_argument('--max-regression', type=float, default=None,
+                            help="Fail when a stage is this fraction slower than the baseline, e.g. 0.2.")
+
+    def handle(self, *args, **options):
+        report = IngestionBenchmark(
+            rows=options['rows'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'],
+            through_view=options['through_view'],
+            csv_path=options['csv'],
+            price_tape_path=options['price_tape'],
+        ).run()
+
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                report['baseline'] = compare_to_baseline(report, json.load(file))
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+        self.stdout.write(json.dumps(report, indent=2))
+
+        if options['baseline'] and options['max_regression'] is not None:
+            regressed = [
+                name for name, comparison in report['baseline'].items()
+                if comparison['wall_time_ratio']
+                and comparison['wall_time_ratio'] > 1 + options['max_regression']
+            ]
+            if regressed:
+                raise CommandError(f"Stages slower than the baseline: {', '.join(regressed)}")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from upload_csv.jobs.upload_job_runner import fail_stale_upload_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark upload jobs whose worker stopped reporting progress as failed, "
+        "e.g. from cron after deploys and restarts."
+    )
+
+    def handle(self, *args, **options):
+        stale_count = fail_stale_upload_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Marked {stale_count} stale upload jobs as failed."))
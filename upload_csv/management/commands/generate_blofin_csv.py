@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from upload_csv.benchmarks.blofin_csv_generator import write_blofin_csv
+
+
+class Command(BaseCommand):
+    help = "Write a synthetic BloFin futures order history CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Where to write the CSV.")
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--canceled-ratio', type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'w', newline='') as file:
+            write_blofin_csv(file, options['rows'], seed=options['seed'],
+                             canceled_ratio=options['canceled_ratio'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['rows']} rows to {options['path']}"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from upload_csv.benchmarks.price_tape import write_price_tape
+
+
+class Command(BaseCommand):
+    help = "Write a synthetic price tape for the replay price source or serve_price_tape."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Where to write the tape.")
+        parser.add_argument('--ticks', type=int, default=1000,
+                            help="Prices recorded per asset.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with open(options['path'], 'w', newline='') as file:
+            write_price_tape(file, options['ticks'], seed=options['seed'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['ticks']} ticks per asset to {options['path']}"))
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from upload_csv.exchange.live_price_updater import LiveTradeUpdater
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Keep live LiveTrades prices fresh, refreshing every distinct live asset on a schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help="Seconds between refreshes (default: LIVE_PRICE_POLL_INTERVAL).")
+        parser.add_argument('--once', action='store_true',
+                            help="Refresh once and exit.")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.LIVE_PRICE_POLL_INTERVAL
+        self.stopping = False
+        # Let the platform's SIGTERM finish the current refresh before exiting
+        signal.signal(signal.SIGTERM, self.stop)
+
+        updater = LiveTradeUpdater()
+        while not self.stopping:
+            start_time = time.monotonic()
+            # The poller outlives any one connection, drop it if it went bad
+            close_old_connections()
+            try:
+                updated = updater.update_live_prices_for_live_trades(refresh=True)
+                logger.info(f"Refreshed live prices for {updated} LiveTrades.")
+            except Exception:
+                logger.exception("Live price refresh failed.")
+
+            if options['once']:
+                break
+            self.sleep(interval - (time.monotonic() - start_time))
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def sleep(self, seconds):
+        # Short naps so a stop request doesn't wait out the whole interval
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(1.0, deadline - time.monotonic()))
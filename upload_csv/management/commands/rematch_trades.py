@@ -0,0 +1,44 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from historical_datasets.realized_pnl import emit_historical_pnl
+from upload_csv.exchange.blofin_trade_matcher import link_trades, save_positions
+from upload_csv.jobs.matching_coordinator import MatchingCoordinator
+from upload_csv.models import TradeUploadBlofin
+
+
+class Command(BaseCommand):
+    help = "Rebuild FIFO matching from scratch for every asset of the given users (default: all)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', default=[],
+                            help="Username to rebuild; repeat for several.")
+        parser.add_argument('--parallelism', type=int, default=None,
+                            help="Worker processes to use (default: MATCHING_PARALLELISM).")
+
+    def handle(self, *args, **options):
+        owners = User.objects.filter(blofin_futures_csv__isnull=False).distinct()
+        if options['user']:
+            owners = owners.filter(username__in=options['user'])
+
+        # Whole histories are rematched, so tasks are sized by trade count
+        sizes = {
+            (row['owner'], row['underlying_asset']): row['trades']
+            for row in TradeUploadBlofin.objects.filter(owner__in=owners).exclude(
+                underlying_asset='').values('owner', 'underlying_asset').annotate(trades=Count('id'))
+        }
+
+        tasks = sorted(sizes)
+
+        results = MatchingCoordinator(options['parallelism']).run(
+            tasks, rebuild=True, sizes=sizes)
+        # Prices are left to the live price updater
+        save_positions(results)
+        owner_ids = list(owners.values_list('id', flat=True))
+        emit_historical_pnl(owner_ids)
+        # Positions created here need their trades pointed at them
+        link_trades(owner_ids, {asset for _, asset in tasks})
+
+        for owner_id, asset, total_quantity in results:
+            self.stdout.write(f"{owner_id} {asset}: open quantity {total_quantity}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(results)} assets."))
@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+from upload_csv.api_handler.price_sources import PriceTape
+import threading
+import random
+import json
+import time
+
+
+class QuoteRequestHandler(BaseHTTPRequestHandler):
+    """Answer GET /quote/<symbols> like FMP's quote endpoint, from the server's tape."""
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if not path.startswith('/quote/'):
+            self.send_error(404)
+            return
+
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.rng_lock:
+            failing = server.rng.random() < server.error_rate
+        if failing:
+            self.send_error(503)
+            return
+
+        quotes = []
+        for symbol in unquote(path[len('/quote/'):]).split(','):
+            price = server.tape.next_price(symbol)
+            if price is not None:
+                quotes.append({'symbol': symbol, 'price': price})
+
+        body = json.dumps(quotes).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a price tape over HTTP in the shape of FMP's quote endpoint, "
+        "for PRICE_SOURCE 'local' to load-test the quote path offline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tape', help="Price tape to serve, e.g. from generate_price_tape.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0,
+                            help="Seconds to wait before answering each request.")
+        parser.add_argument('--error-rate', type=float, default=0,
+                            help="Fraction of requests answered with a 503, e.g. 0.05.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer((options['host'], options['port']), QuoteRequestHandler)
+        server.daemon_threads = True
+        server.tape = PriceTape(options['tape'])
+        server.latency = options['latency']
+        server.error_rate = options['error_rate']
+        server.rng = random.Random(options['seed'])
+        server.rng_lock = threading.Lock()
+        server.verbose = options['verbosity'] > 1
+
+        self.stdout.write(f"Serving {options['tape']} on http://{options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
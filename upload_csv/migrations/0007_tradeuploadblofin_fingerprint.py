@@ -0,0 +1,80 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:41
+
+from datetime import timezone
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def build_trade_fingerprint(owner_id, order_time, underlying_asset, side, fee, avg_fill):
+    """
+    The trade fingerprint as it was defined when this migration was written.
+
+    Copied rather than imported, so a later change to the live fingerprint
+    can't change what this migration keeps and deletes.
+    """
+    key = '|'.join([
+        str(owner_id),
+        order_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+        underlying_asset,
+        side,
+        format(Decimal(fee).quantize(Decimal('0.0000000001'), rounding=ROUND_HALF_UP), 'f'),
+        format(Decimal(avg_fill).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP), 'f'),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def populate_fingerprints(apps, schema_editor):
+    """Fingerprint existing trades, deleting later copies of the same trade."""
+    TradeUploadBlofin = apps.get_model('upload_csv', 'TradeUploadBlofin')
+
+    seen = set()
+    duplicate_ids = []
+    updated_trades = []
+
+    trades = TradeUploadBlofin.objects.order_by('id').only(
+        'id', 'owner_id', 'order_time', 'underlying_asset', 'side', 'fee', 'avg_fill')
+    for trade in trades.iterator():
+        fingerprint = build_trade_fingerprint(
+            trade.owner_id, trade.order_time, trade.underlying_asset,
+            trade.side, trade.fee, trade.avg_fill)
+        if fingerprint in seen:
+            duplicate_ids.append(trade.id)
+            continue
+        seen.add(fingerprint)
+        trade.fingerprint = fingerprint
+        updated_trades.append(trade)
+
+    if duplicate_ids:
+        logger.warning(f"Deleting {len(duplicate_ids)} duplicate trades found while fingerprinting.")
+    TradeUploadBlofin.objects.filter(id__in=duplicate_ids).delete()
+    TradeUploadBlofin.objects.bulk_update(
+        updated_trades, ['fingerprint'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0006_uploadjob_covered_from_uploadjob_covered_to_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='tradeuploadblofin',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='tradeuploadblofin',
+            name='fingerprint',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tradeuploadblofin',
+            name='fingerprint',
+            field=models.CharField(editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
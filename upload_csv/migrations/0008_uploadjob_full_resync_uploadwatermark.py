@@ -0,0 +1,34 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('upload_csv', '0007_tradeuploadblofin_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='full_resync',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='UploadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange', models.CharField(choices=[('BloFin', 'BloFin'), ('OtherExchange', 'Other Exchange')], max_length=100)),
+                ('high_water_mark', models.DateTimeField()),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_watermarks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'exchange')},
+            },
+        ),
+    ]
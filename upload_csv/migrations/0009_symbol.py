@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:44
+
+from django.db import migrations, models
+
+# The assets previously hard-coded as the upload allowlist
+INITIAL_SYMBOLS = [
+    'ARBUSDT', 'BTCUSDT', 'ETHUSDT', 'RUNEUSDT', 'INJUSDT', 'VRAUSDT', 'LDOUSDT',
+    'WIFUSDT', 'SOLUSDT', 'BLURUSDT', 'MATICUSDT', 'SEIUSDT', 'NEARUSDT',
+]
+
+
+def seed_symbols(apps, schema_editor):
+    Symbol = apps.get_model('upload_csv', 'Symbol')
+    Symbol.objects.bulk_create([
+        Symbol(exchange_symbol=symbol, quote_symbol=symbol.rstrip('T'))
+        for symbol in INITIAL_SYMBOLS
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0008_uploadjob_full_resync_uploadwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Symbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('exchange_symbol', models.CharField(max_length=10, unique=True)),
+                ('quote_symbol', models.CharField(max_length=25)),
+                ('tick_precision', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('is_enabled', models.BooleanField(default=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['exchange_symbol'],
+            },
+        ),
+        migrations.RunPython(seed_symbols, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.11 on 2026-10-18 08:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('upload_csv', '0009_symbol'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatcherCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset', models.CharField(max_length=10)),
+                ('last_order_time', models.DateTimeField()),
+                ('last_trade_id', models.IntegerField()),
+                ('trade_count', models.IntegerField()),
+                ('open_buys', models.JSONField(default=list)),
+                ('open_sells', models.JSONField(default=list)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matcher_checkpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('owner', 'asset')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_matcher_checkpoints(apps, schema_editor):
+    """Make the next match of every asset a full rebuild, which fills the ledger."""
+    MatcherCheckpoint = apps.get_model('upload_csv', 'MatcherCheckpoint')
+    MatcherCheckpoint.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('upload_csv', '0010_matchercheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset', models.CharField(max_length=10)),
+                ('quantity', models.DecimalField(decimal_places=10, max_digits=20)),
+                ('entry_price', models.DecimalField(decimal_places=20, max_digits=40)),
+                ('exit_price', models.DecimalField(decimal_places=20, max_digits=40)),
+                ('opened_at', models.DateTimeField()),
+                ('closed_at', models.DateTimeField()),
+                ('realized_pnl', models.DecimalField(decimal_places=10, max_digits=30)),
+                ('buy_trade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buy_matches', to='upload_csv.tradeuploadblofin')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trade_matches', to=settings.AUTH_USER_MODEL)),
+                ('sell_trade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sell_matches', to='upload_csv.tradeuploadblofin')),
+            ],
+            options={
+                'ordering': ['-closed_at', '-id'],
+                'indexes': [models.Index(fields=['owner', 'asset', 'closed_at'], name='upload_csv__owner_i_541d30_idx'), models.Index(fields=['owner', 'closed_at'], name='upload_csv__owner_i_94a67a_idx')],
+            },
+        ),
+        migrations.RunPython(drop_matcher_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+import json
+
+
+def link_trades(apps, schema_editor):
+    """Point each trade at the position whose trade_ids list held it."""
+    LiveTrades = apps.get_model('upload_csv', 'LiveTrades')
+    TradeUploadBlofin = apps.get_model('upload_csv', 'TradeUploadBlofin')
+    for live_trade in LiveTrades.objects.only('id', 'owner_id', 'trade_ids').iterator():
+        trade_ids = json.loads(live_trade.trade_ids or '[]')
+        if trade_ids:
+            TradeUploadBlofin.objects.filter(
+                id__in=trade_ids, owner_id=live_trade.owner_id
+            ).update(live_trade=live_trade)
+
+
+def unlink_trades(apps, schema_editor):
+    """Write the linked trade ids back into trade_ids."""
+    LiveTrades = apps.get_model('upload_csv', 'LiveTrades')
+    TradeUploadBlofin = apps.get_model('upload_csv', 'TradeUploadBlofin')
+    trade_ids = {}
+    for trade_id, live_trade_id in TradeUploadBlofin.objects.filter(
+            live_trade__isnull=False).values_list('id', 'live_trade_id'):
+        trade_ids.setdefault(live_trade_id, []).append(trade_id)
+    for live_trade_id, ids in trade_ids.items():
+        LiveTrades.objects.filter(id=live_trade_id).update(trade_ids=json.dumps(ids))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0011_tradematch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tradeuploadblofin',
+            name='live_trade',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trades', to='upload_csv.livetrades'),
+        ),
+        migrations.RunPython(link_trades, unlink_trades),
+        migrations.RemoveField(
+            model_name='livetrades',
+            name='trade_ids',
+        ),
+    ]
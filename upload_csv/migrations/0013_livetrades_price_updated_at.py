@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0012_tradeuploadblofin_live_trade'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='livetrades',
+            name='price_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
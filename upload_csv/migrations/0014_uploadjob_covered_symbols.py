@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_csv', '0013_livetrades_price_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='covered_symbols',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:05
+
+from datetime import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rebuild_watermarks(apps, schema_editor):
+    # An exchange-wide mark can't say which symbols it covers, so each
+    # symbol's mark is rebuilt from what completed uploads stored for it
+    UploadJob = apps.get_model('upload_csv', 'UploadJob')
+    UploadWatermark = apps.get_model('upload_csv', 'UploadWatermark')
+    UploadWatermark.objects.all().delete()
+
+    marks = {}
+    for owner_id, exchange, covered_symbols in UploadJob.objects.filter(
+        status='completed'
+    ).values_list('owner_id', 'exchange', 'covered_symbols'):
+        for symbol, (_, covered_to) in covered_symbols.items():
+            key = (owner_id, exchange, symbol)
+            covered_to = datetime.fromisoformat(covered_to)
+            if key not in marks or marks[key] < covered_to:
+                marks[key] = covered_to
+
+    UploadWatermark.objects.bulk_create([
+        UploadWatermark(owner_id=owner_id, exchange=exchange, symbol=symbol, high_water_mark=mark)
+        for (owner_id, exchange, symbol), mark in marks.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('upload_csv', '0014_uploadjob_covered_symbols'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='synced_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadwatermark',
+            name='symbol',
+            field=models.CharField(default='', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AlterUniqueTogether(
+            name='uploadwatermark',
+            unique_together={('owner', 'exchange', 'symbol')},
+        ),
+        migrations.RunPython(rebuild_watermarks, migrations.RunPython.noop),
+    ]
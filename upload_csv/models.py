@@ -1,7 +1,7 @@
 from django.contrib.auth.models import User
 from django.db import models
 from decimal import Decimal
-import json
+from upload_csv.utils.trade_fingerprint import build_trade_fingerprint
 
 
 class TradeUploadBlofin(models.Model):
@@ -39,15 +39,28 @@ class TradeUploadBlofin(models.Model):
     is_matched = models.BooleanField(default=None)
     is_partially_matched = models.BooleanField(default=False)
     last_updated = models.DateTimeField(auto_now=True)
+    fingerprint = models.CharField(
+        max_length=64, unique=True, null=True, editable=False)
+    # Position this trade belongs to, set once the matcher has seen it
+    live_trade = models.ForeignKey(
+        'LiveTrades', on_delete=models.SET_NULL, null=True, blank=True, related_name='trades')
 
     class Meta:
         ordering = ['-order_time']
-        unique_together = ('underlying_asset',
-                           'avg_fill', 'fee')
 
     def __str__(self):
         return f"{self.underlying_asset} - {self.side}"
 
+    def build_fingerprint(self):
+        return build_trade_fingerprint(
+            self.owner_id, self.order_time, self.underlying_asset,
+            self.side, self.fee, self.avg_fill)
+
+    def save(self, *args, **kwargs):
+        if not self.fingerprint:
+            self.fingerprint = self.build_fingerprint()
+        super().save(*args, **kwargs)
+
 
 class LiveTrades(models.Model):
     owner = models.ForeignKey(
@@ -59,20 +72,17 @@ class LiveTrades(models.Model):
         max_digits=20, decimal_places=10, blank=True, null=True)
     live_price = models.DecimalField(
         max_digits=20, decimal_places=10, blank=True, null=True)
+    # When live_price was last refreshed from a quote
+    price_updated_at = models.DateTimeField(blank=True, null=True)
     live_pnl = models.DecimalField(
         max_digits=20, decimal_places=2, null=True, blank=True)
     live_percentage = models.DecimalField(
         max_digits=20, decimal_places=2, null=True, blank=True)
     last_updated = models.DateTimeField(auto_now=True)
-    trade_ids = models.TextField(default='[]')
     is_live = models.BooleanField(default=False)
 
     def get_trade_ids(self):
-        # Deserialize JSON string to list
-        return json.loads(self.trade_ids)
-
-    def set_trade_ids(self, trade_ids):
-        self.trade_ids = json.dumps(trade_ids)
+        return list(self.trades.values_list('id', flat=True))
 
     class Meta:
         unique_together = ('owner', 'asset')
@@ -80,3 +90,142 @@ class LiveTrades(models.Model):
 
     def __str__(self):
         return f"{self.asset} - Quantity: {self.total_quantity}"
+
+
+class UploadJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='upload_jobs')
+    exchange = models.CharField(
+        max_length=100, choices=TradeUploadBlofin.EXCHANGE_CHOICES)
+    file_name = models.CharField(max_length=255, blank=True)
+    file_hash = models.CharField(max_length=64, blank=True)
+    full_resync = models.BooleanField(default=False)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reuploads')
+    covered_from = models.DateTimeField(null=True, blank=True)
+    covered_to = models.DateTimeField(null=True, blank=True)
+    # Symbol to [from, to] order times of the rows this upload stored
+    covered_symbols = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default='pending')
+    rows_parsed = models.IntegerField(default=0)
+    new_trades_count = models.IntegerField(default=0)
+    duplicates_count = models.IntegerField(default=0)
+    canceled_count = models.IntegerField(default=0)
+    # Rows skipped as already synced by an earlier upload, not as duplicates
+    synced_count = models.IntegerField(default=0)
+    stage_timings = models.JSONField(default=dict)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Last time the worker reported progress
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'exchange', 'file_hash']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.id} - {self.owner} - {self.status}"
+
+
+class UploadWatermark(models.Model):
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='upload_watermarks')
+    exchange = models.CharField(
+        max_length=100, choices=TradeUploadBlofin.EXCHANGE_CHOICES)
+    symbol = models.CharField(max_length=10)
+    high_water_mark = models.DateTimeField()
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('owner', 'exchange', 'symbol')
+
+    def __str__(self):
+        return f"{self.owner} - {self.exchange} {self.symbol}: {self.high_water_mark}"
+
+    @classmethod
+    def advance(cls, owner, exchange, symbol, order_time):
+        """Raise the owner's mark for the exchange's symbol to order_time, never lower it."""
+        watermark, created = cls.objects.get_or_create(
+            owner=owner, exchange=exchange, symbol=symbol,
+            defaults={'high_water_mark': order_time})
+        if not created and watermark.high_water_mark < order_time:
+            watermark.high_water_mark = order_time
+            watermark.save(update_fields=['high_water_mark', 'last_updated'])
+        return watermark
+
+
+class Symbol(models.Model):
+    exchange_symbol = models.CharField(max_length=10, unique=True)
+    quote_symbol = models.CharField(max_length=25)
+    tick_precision = models.PositiveSmallIntegerField(null=True, blank=True)
+    is_enabled = models.BooleanField(default=True)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['exchange_symbol']
+
+    def __str__(self):
+        return f"{self.exchange_symbol} -> {self.quote_symbol}"
+
+
+class MatcherCheckpoint(models.Model):
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='matcher_checkpoints')
+    asset = models.CharField(max_length=10)
+    # Position of the last trade matched, in (order_time, id) order
+    last_order_time = models.DateTimeField()
+    last_trade_id = models.IntegerField()
+    # Trades at or before that position, used to spot back-dated inserts
+    trade_count = models.IntegerField()
+    # FIFO queues still open after the last trade, oldest first
+    open_buys = models.JSONField(default=list)
+    open_sells = models.JSONField(default=list)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('owner', 'asset')
+
+    def __str__(self):
+        return f"{self.owner} - {self.asset}: {self.last_order_time}"
+
+
+class TradeMatch(models.Model):
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='trade_matches')
+    asset = models.CharField(max_length=10)
+    buy_trade = models.ForeignKey(
+        TradeUploadBlofin, on_delete=models.CASCADE, related_name='buy_matches')
+    sell_trade = models.ForeignKey(
+        TradeUploadBlofin, on_delete=models.CASCADE, related_name='sell_matches')
+    quantity = models.DecimalField(max_digits=20, decimal_places=10)
+    entry_price = models.DecimalField(max_digits=40, decimal_places=20)
+    exit_price = models.DecimalField(max_digits=40, decimal_places=20)
+    opened_at = models.DateTimeField()
+    closed_at = models.DateTimeField()
+    # (sell price - buy price) * quantity, before fees, for longs and shorts alike
+    realized_pnl = models.DecimalField(max_digits=30, decimal_places=10)
+
+    class Meta:
+        ordering = ['-closed_at', '-id']
+        indexes = [
+            models.Index(fields=['owner', 'asset', 'closed_at']),
+            models.Index(fields=['owner', 'closed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.asset} - {self.quantity} closed {self.closed_at}"
+
+    @property
+    def holding_period(self):
+        return self.closed_at - self.opened_at
@@ -0,0 +1 @@
+from upload_csv.registry.symbol_registry import get_symbol_map, get_symbol, enabled_symbols, quote_symbol_for, invalidate_symbol_map
@@ -0,0 +1,68 @@
+from upload_csv.models import Symbol
+from collections import namedtuple
+from types import MappingProxyType
+from django.conf import settings
+import threading
+import time
+
+SymbolInfo = namedtuple(
+    'SymbolInfo', ['exchange_symbol', 'quote_symbol', 'tick_precision', 'is_enabled'])
+
+_symbol_map = None
+_enabled_symbols = frozenset()
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_symbol_map():
+    """
+    Return the process-local, read-only map of exchange symbol to SymbolInfo.
+
+    The map is loaded with one query and kept until a Symbol is saved or
+    deleted in this process, or SYMBOL_REGISTRY_TTL seconds pass so changes
+    made by other workers are picked up too.
+    """
+    global _symbol_map, _enabled_symbols, _loaded_at
+
+    symbol_map = _symbol_map
+    if symbol_map is not None and time.monotonic() - _loaded_at < settings.SYMBOL_REGISTRY_TTL:
+        return symbol_map
+
+    with _lock:
+        if _symbol_map is None or time.monotonic() - _loaded_at >= settings.SYMBOL_REGISTRY_TTL:
+            symbols = {
+                row[0]: SymbolInfo(*row)
+                for row in Symbol.objects.values_list(
+                    'exchange_symbol', 'quote_symbol', 'tick_precision', 'is_enabled')
+            }
+            _enabled_symbols = frozenset(
+                symbol for symbol, info in symbols.items() if info.is_enabled)
+            _symbol_map = MappingProxyType(symbols)
+            _loaded_at = time.monotonic()
+        return _symbol_map
+
+
+def invalidate_symbol_map():
+    """Drop the loaded map so the next lookup reads the registry again."""
+    global _symbol_map
+    with _lock:
+        _symbol_map = None
+
+
+def get_symbol(exchange_symbol):
+    return get_symbol_map().get(exchange_symbol)
+
+
+def enabled_symbols():
+    """Return the frozenset of exchange symbols accepted on upload."""
+    get_symbol_map()
+    return _enabled_symbols
+
+
+def quote_symbol_for(exchange_symbol):
+    """Map an exchange symbol such as 'BTCUSDT' to its quote provider symbol."""
+    info = get_symbol(exchange_symbol)
+    if info is None:
+        # Unregistered symbols keep the old USDT -> USD convention
+        return exchange_symbol.rstrip('T')
+    return info.quote_symbol
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import TradeUploadBlofin, LiveTrades
+from .models import TradeUploadBlofin, LiveTrades, UploadJob, TradeMatch
 from collections import defaultdict
 from decimal import Decimal
 from django.contrib.auth.models import User
@@ -11,16 +11,38 @@ class LiveFillSerializer(serializers.ModelSerializer):
         fields = ['live_fill']  # Only include the live_fill field
 
 class LiveTradesSerializer(serializers.ModelSerializer):
+    # The trades themselves are listed, a page at a time, under live-trades/<id>/trades/
+    trade_count = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = LiveTrades
         fields = ['id', 'owner', 'asset',
-                  'total_quantity', 'long_short', 'live_price', 'live_fill', 'live_pnl', 'live_percentage', 'trade_ids', 'last_updated', 'is_live']
+                  'total_quantity', 'long_short', 'live_price', 'live_fill', 'live_pnl', 'live_percentage', 'trade_count', 'last_updated', 'price_updated_at', 'is_live']
+
+
+class TradeMatchSerializer(serializers.ModelSerializer):
+    holding_period = serializers.DurationField(read_only=True)
+
+    class Meta:
+        model = TradeMatch
+        fields = ['id', 'asset', 'buy_trade', 'sell_trade', 'quantity', 'entry_price', 'exit_price',
+                  'opened_at', 'closed_at', 'holding_period', 'realized_pnl']
 
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
     exchange = serializers.ChoiceField(
         choices=[('BloFin', 'BloFin'), ('OtherExchange', 'Other Exchange')])
+    full_resync = serializers.BooleanField(required=False, default=False)
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'owner', 'exchange', 'file_name', 'file_hash', 'full_resync', 'duplicate_of',
+                  'covered_from', 'covered_to', 'covered_symbols', 'status', 'rows_parsed',
+                  'new_trades_count', 'duplicates_count', 'canceled_count', 'synced_count',
+                  'stage_timings', 'error', 'created_at', 'started_at', 'heartbeat_at', 'finished_at']
 
 
 class SaveTradeSerializer(serializers.ModelSerializer):
@@ -40,7 +62,7 @@ class SaveTradeSerializer(serializers.ModelSerializer):
                   'trade_status', 'is_open', 'is_matched', 'last_updated']
 
     def get_avg_fill_formatted(self, obj):
-        return FormattingUtils.formatted_value(obj.avg_fill)
+        return FormattingUtils.formatted_value(obj.avg_fill, asset=obj.underlying_asset)
 
     def get_original_filled_quantity_formatted(self, obj):
         return FormattingUtils.formatted_original_filled_quantity(obj.original_filled_quantity)
@@ -55,4 +77,4 @@ class SaveTradeSerializer(serializers.ModelSerializer):
         return FormattingUtils.formatted_percentage(obj.pnl_percentage, obj.avg_fill, obj.price, obj.is_open)
 
     def get_price_formatted(self, obj):
-        return FormattingUtils.formatted_price(obj.price, obj.avg_fill, obj.is_open)
+        return FormattingUtils.formatted_price(obj.price, obj.avg_fill, obj.is_open, asset=obj.underlying_asset)
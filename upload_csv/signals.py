@@ -0,0 +1,9 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Symbol
+from upload_csv.registry.symbol_registry import invalidate_symbol_map
+
+
+@receiver([post_save, post_delete], sender=Symbol)
+def invalidate_symbol_map_on_change(sender, instance, **kwargs):
+    invalidate_symbol_map()
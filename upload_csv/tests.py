@@ -1,3 +1,563 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from unittest import mock
+import pandas as pd
+import threading
+import tempfile
+import os
+import random
+import copy
+import requests
+import time
+import io
+from upload_csv.models import LiveTrades, MatcherCheckpoint, Symbol, TradeMatch, TradeUploadBlofin, UploadJob
+from upload_csv.exchange.blofin import BloFinHandler, TradeUpdater
+from upload_csv.exchange.blofin_trade_matcher import TradeMatcherProcessor, save_positions
+from upload_csv.jobs import upload_job_runner
+from upload_csv.jobs.upload_job_runner import fail_stale_upload_jobs, run_upload_job
+from upload_csv.calculations.fifo_matching import match_fifo, match_fifo_vectorized, new_lot
+from upload_csv.api_handler.price_sources import PriceSource
+from upload_csv.api_handler.quote_client import QuoteClient
+from upload_csv.api_handler import fmp_api, quote_cache
 
-# Create your tests here.
+
+def make_trade(owner, **fields):
+    """An unsaved BloFin trade with its fingerprint, overriding any of its fields."""
+    trade = TradeUploadBlofin(
+        owner=owner,
+        underlying_asset='BTCUSDT',
+        margin_mode='Cross',
+        leverage=10,
+        order_time=datetime(2024, 5, 10, 10, 0, 0, tzinfo=timezone.utc),
+        side='Buy',
+        avg_fill=Decimal('62000.5'),
+        price=Decimal('62000.5'),
+        filled_quantity=Decimal('0.5'),
+        fee=Decimal('0.0123'),
+        reduce_only=False,
+        trade_status='Filled',
+        exchange='BloFin',
+        is_open=False,
+        is_matched=False,
+    )
+    for name, value in fields.items():
+        setattr(trade, name, value)
+    trade.fingerprint = trade.build_fingerprint()
+    return trade
+
+
+class SavePositionsTests(TestCase):
+
+    def setUp(self):
+        self.owner = User.objects.create(username='positions')
+
+    def test_missing_quote_keeps_last_price(self):
+        LiveTrades.objects.create(owner=self.owner, asset='BTCUSDT', total_quantity=1, live_price=Decimal('100'))
+
+        save_positions([(self.owner.id, 'BTCUSDT', Decimal('2')), (self.owner.id, 'ETHUSDT', Decimal('3'))],
+                       live_prices={})
+
+        btc = LiveTrades.objects.get(owner=self.owner, asset='BTCUSDT')
+        eth = LiveTrades.objects.get(owner=self.owner, asset='ETHUSDT')
+        self.assertEqual(btc.total_quantity, Decimal('2'))
+        self.assertEqual(btc.live_price, Decimal('100'))
+        self.assertIsNone(eth.live_price)
+
+    def test_quoted_asset_gets_new_price(self):
+        LiveTrades.objects.create(owner=self.owner, asset='BTCUSDT', total_quantity=1, live_price=Decimal('100'))
+
+        save_positions([(self.owner.id, 'BTCUSDT', Decimal('1'))], live_prices={'BTCUSDT': 101.5})
+
+        self.assertEqual(LiveTrades.objects.get(owner=self.owner).live_price, Decimal('101.5'))
+
+    def test_price_refresh_time_follows_the_price(self):
+        save_positions([(self.owner.id, 'BTCUSDT', Decimal('1'))], live_prices={'BTCUSDT': 101.5})
+        priced_at = LiveTrades.objects.get(owner=self.owner).price_updated_at
+        self.assertIsNotNone(priced_at)
+
+        save_positions([(self.owner.id, 'BTCUSDT', Decimal('2'))], live_prices={})
+        self.assertEqual(LiveTrades.objects.get(owner=self.owner).price_updated_at, priced_at)
+
+
+class LivePricePollerTests(TestCase):
+
+    def test_poller_skips_symbols_leased_by_another_worker(self):
+        call_command('createcachetable', verbosity=0)
+        quote_cache.quote_cache().clear()
+        owner = User.objects.create(username='poller')
+        LiveTrades.objects.create(owner=owner, asset='BTCUSDT', total_quantity=1, live_price=5, is_live=True)
+        LiveTrades.objects.create(owner=owner, asset='ETHUSDT', total_quantity=1, live_price=7, is_live=True)
+        # A closed position isn't quoted
+        LiveTrades.objects.create(owner=owner, asset='SOLUSDT', total_quantity=0, live_price=3)
+        # Another worker is fetching ETHUSDT and never finishes
+        quote_cache.quote_cache().add('quote-lease:ETHUSDT', 'other', 10)
+
+        fetched = []
+
+        def fetch_quotes(symbols, failed=None):
+            fetched.append(sorted(symbols))
+            return {symbol: 10.0 for symbol in symbols}
+
+        with mock.patch.object(quote_cache, 'fetch_quotes', fetch_quotes), \
+                override_settings(QUOTE_CACHE_LEASE_TTL=0.2):
+            call_command('poll_live_prices', '--once')
+
+        self.assertEqual(fetched, [['BTCUSDT']])
+        self.assertEqual(LiveTrades.objects.get(asset='BTCUSDT').live_price, Decimal('10'))
+        self.assertEqual(LiveTrades.objects.get(asset='ETHUSDT').live_price, Decimal('7'))
+        self.assertEqual(LiveTrades.objects.get(asset='SOLUSDT').live_price, Decimal('3'))
+        self.assertIsNone(quote_cache.quote_cache().get('quote-lease:BTCUSDT'))
+
+
+class TradeFingerprintTests(TestCase):
+
+    def test_reinserted_trade_is_ignored(self):
+        owner = User.objects.create(username='fingerprints')
+        TradeUploadBlofin.objects.bulk_create([make_trade(owner)], ignore_conflicts=True)
+
+        TradeUploadBlofin.objects.bulk_create([
+            make_trade(owner),
+            # The same trade read back with float rounding noise
+            make_trade(owner, fee=Decimal('0.012300000000004'), avg_fill=Decimal('62000.50000000001')),
+        ], ignore_conflicts=True)
+
+        self.assertEqual(TradeUploadBlofin.objects.filter(owner=owner).count(), 1)
+
+    def test_different_trade_is_kept(self):
+        owner = User.objects.create(username='fingerprints')
+        TradeUploadBlofin.objects.bulk_create([make_trade(owner)], ignore_conflicts=True)
+
+        TradeUploadBlofin.objects.bulk_create([make_trade(owner, avg_fill=Decimal('62001'))], ignore_conflicts=True)
+
+        self.assertEqual(TradeUploadBlofin.objects.filter(owner=owner).count(), 2)
+
+
+class ProcessFrameTests(TestCase):
+
+    CSV = (
+        'Underlying Asset,Margin Mode,Leverage,Order Time,Side,Avg Fill,Price,Filled,Total,'
+        'PNL,PNL%,Fee,Order Options,Reduce-only,Status\n'
+        'BTCUSDT,Cross,10,05/10/2024 10:00:00,Buy,62000.5,Market,0.500 BTC,0.500 BTC,'
+        '--,--,0.012300 USDT,--,N,Filled\n'
+        'BTCUSDT,Cross,10,05/10/2024 11:30:15,Sell,63010.25,63010.25,0.200 BTC,0.200 BTC,'
+        '202.1 USDT,16.3%,-0.004200 USDT,--,Y,Partial Fill\n'
+        'ETHUSDT,Isolated,5,05/11/2024 08:05:00,Sell,3050.1,3050.1,2.000 ETH,2.000 ETH,'
+        '--,--,--,--,N,Filled\n'
+        'ETHUSDT,Isolated,5,05/11/2024 09:00:00,Buy,2990,Market,2.000 ETH,2.000 ETH,'
+        '-120.2 USDT,-4%,0.5 USDT,--,Y,Filled\n'
+        'BTCUSDT,Cross,10,05/12/2024 12:00:00,Buy,61000,61000,0.100 BTC,0.100 BTC,'
+        '--,--,0.001000 USDT,--,N,Canceled\n'
+        'NOTLISTEDUSDT,Cross,3,05/12/2024 13:00:00,Buy,1.5,1.5,10 NOT,10 NOT,'
+        '--,--,0.01 USDT,--,N,Filled\n'
+    )
+
+    FIELDS = [
+        'underlying_asset', 'margin_mode', 'order_time', 'side', 'avg_fill', 'price',
+        'filled_quantity', 'original_filled_quantity', 'pnl', 'pnl_percentage', 'fee',
+        'reduce_only', 'trade_status', 'exchange', 'is_open', 'is_matched',
+    ]
+
+    def setUp(self):
+        self.owner = User.objects.create(username='frame')
+
+    def as_fields(self, trade):
+        fields = {name: getattr(trade, name) for name in self.FIELDS}
+        fields['leverage'] = int(trade.leverage)
+        fields['fingerprint'] = trade.build_fingerprint()
+        return fields
+
+    def test_frame_builds_the_same_trades_as_rows(self):
+        frame = pd.read_csv(io.StringIO(self.CSV))
+        handler = BloFinHandler()
+
+        trades, canceled_count, skipped_count = handler.process_frame(frame, self.owner, 'BloFin')
+        # Rows are read as text, since Decimal(float) would keep a numeric
+        # column's binary expansion where the frame keeps the CSV's value
+        rows = pd.read_csv(io.StringIO(self.CSV), dtype=str)
+        row_trades = [
+            trade for trade in (
+                handler.process_row(row, self.owner, 'BloFin') for _, row in rows.iterrows())
+            if trade is not None
+        ]
+
+        self.assertEqual(canceled_count, 1)
+        self.assertEqual(skipped_count, 1)
+        self.assertEqual(len(trades), 4)
+        self.assertEqual([self.as_fields(trade) for trade in trades],
+                         [self.as_fields(trade) for trade in row_trades])
+        self.assertEqual([trade.fingerprint for trade in trades],
+                         [trade.build_fingerprint() for trade in trades])
+        self.assertEqual(trades[2].avg_fill, Decimal('3050.1'))
+
+
+class UploadCoverageTests(TestCase):
+    HEADER = 'Underlying Asset,Margin Mode,Leverage,Order Time,Side,Avg Fill,Price,Filled,Total,PNL,PNL%,Fee,Order Options,Reduce-only,Status'
+
+    def row(self, asset, order_time, fill):
+        return f"{asset},Cross,5,{order_time},Buy,{fill},{fill},1 {asset[:-4]},1 {asset[:-4]},--,--,0.1 USDT,--,N,Filled"
+
+    def upload(self, owner, rows):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write('\n'.join([self.HEADER] + rows) + '\n')
+        job = UploadJob.objects.create(owner=owner, exchange='BloFin', file_name='trades.csv')
+        # The job removes the file once it is done with it
+        with mock.patch('upload_csv.jobs.upload_job_runner.TradeIdMatcher'):
+            run_upload_job(job.id, file.name)
+        job.refresh_from_db()
+        return job
+
+    def test_symbol_enabled_later_is_not_skipped(self):
+        owner = User.objects.create(username='coverage')
+        rows = [
+            self.row('BTCUSDT', '04/01/2024 10:00:00', 100),
+            self.row('BTCUSDT', '05/10/2024 10:00:00', 101),
+            self.row('DOGEUSDT', '04/01/2024 10:00:00', 0.1),
+            self.row('DOGEUSDT', '05/10/2024 10:00:00', 0.2),
+        ]
+
+        job = self.upload(owner, rows)
+        self.assertEqual(job.new_trades_count, 2)
+        self.assertEqual(list(job.covered_symbols), ['BTCUSDT'])
+
+        Symbol.objects.create(exchange_symbol='DOGEUSDT', quote_symbol='DOGEUSD', tick_precision=5)
+        job = self.upload(owner, rows)
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.new_trades_count, 2)
+        self.assertEqual(TradeUploadBlofin.objects.filter(owner=owner, underlying_asset='DOGEUSDT').count(), 2)
+        self.assertEqual(TradeUploadBlofin.objects.filter(owner=owner, underlying_asset='BTCUSDT').count(), 2)
+
+    def test_watermark_is_per_symbol(self):
+        owner = User.objects.create(username='watermarks')
+        self.upload(owner, [
+            self.row('BTCUSDT', '01/05/2024 10:00:00', 100),
+            self.row('BTCUSDT', '02/20/2024 10:00:00', 101),
+            self.row('ETHUSDT', '01/05/2024 10:00:00', 10),
+            self.row('ETHUSDT', '06/20/2024 10:00:00', 11),
+        ])
+
+        # BTC rows newer than BTC's own coverage, though older than ETH's
+        job = self.upload(owner, [
+            self.row('BTCUSDT', '01/05/2024 10:00:00', 100),
+            self.row('BTCUSDT', '03/10/2024 10:00:00', 102),
+            self.row('BTCUSDT', '04/10/2024 10:00:00', 103),
+        ])
+
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.new_trades_count, 2)
+        self.assertEqual(job.duplicates_count, 0)
+        self.assertEqual(job.synced_count, 1)
+        self.assertEqual(TradeUploadBlofin.objects.filter(owner=owner, underlying_asset='BTCUSDT').count(), 4)
+
+
+class UploadJobRunnerTests(TestCase):
+
+    def test_stale_jobs_are_failed(self):
+        owner = User.objects.create(username='jobs')
+        day_ago = datetime.now(timezone.utc) - timedelta(days=1)
+        stale = UploadJob.objects.create(owner=owner, exchange='BloFin', status='running')
+        UploadJob.objects.filter(id=stale.id).update(created_at=day_ago, started_at=day_ago, heartbeat_at=day_ago)
+        # Long queued and long running, but still making progress
+        busy = UploadJob.objects.create(owner=owner, exchange='BloFin', status='running')
+        UploadJob.objects.filter(id=busy.id).update(created_at=day_ago, started_at=day_ago, heartbeat_at=datetime.now(timezone.utc))
+
+        self.assertEqual(fail_stale_upload_jobs(), 1)
+        self.assertEqual(UploadJob.objects.get(id=stale.id).status, 'failed')
+        self.assertEqual(UploadJob.objects.get(id=busy.id).status, 'running')
+
+    def test_job_failed_as_stale_stays_failed(self):
+        owner = User.objects.create(username='jobs')
+        job = UploadJob.objects.create(owner=owner, exchange='BloFin')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(ProcessFrameTests.CSV)
+
+        def fail_as_stale():
+            UploadJob.objects.filter(id=job.id).update(status='failed', error='stale')
+
+        with mock.patch('upload_csv.jobs.upload_job_runner.TradeIdMatcher') as matcher:
+            matcher.return_value.check_trade_ids.side_effect = fail_as_stale
+            run_upload_job(job.id, file.name)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('failed', 'stale'))
+        self.assertFalse(os.path.exists(file.name))
+
+    def test_file_is_removed_when_the_job_cannot_be_queued(self):
+        owner = User.objects.create(username='jobs')
+        job = UploadJob.objects.create(owner=owner, exchange='BloFin')
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as file:
+            file.write(b'x')
+
+        executor = mock.Mock(**{'submit.side_effect': RuntimeError('cannot schedule new futures after shutdown')})
+        with override_settings(UPLOAD_JOBS_ASYNC=True), \
+                mock.patch.object(upload_job_runner, 'get_executor', return_value=executor), \
+                self.assertRaises(RuntimeError):
+            upload_job_runner.enqueue_upload_job(job, file.name)
+
+        self.assertFalse(os.path.exists(file.name))
+        self.assertEqual(UploadJob.objects.get(id=job.id).status, 'failed')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'quotes': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'quote-tests'},
+})
+class QuoteCacheTests(TestCase):
+
+    def setUp(self):
+        quote_cache.quote_cache().clear()
+        self.calls = []
+        self.calls_lock = threading.Lock()
+
+    def fetch_quotes(self, symbols, failed=None):
+        """Stand-in provider, slow enough for every caller to miss before it answers."""
+        with self.calls_lock:
+            self.calls.extend(symbols)
+        time.sleep(0.2)
+        return {symbol: 100.0 for symbol in symbols}
+
+    def test_concurrent_misses_fetch_each_symbol_once(self):
+        symbols = ['BTCUSDT', 'ETHUSDT']
+        callers = 8
+        barrier = threading.Barrier(callers)
+        results = []
+
+        def get_quotes():
+            barrier.wait()
+            results.append(quote_cache.get_quotes(symbols))
+
+        with mock.patch.object(quote_cache, 'fetch_quotes', self.fetch_quotes):
+            threads = [threading.Thread(target=get_quotes) for _ in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(sorted(self.calls), symbols)
+        self.assertEqual(results, [{'BTCUSDT': 100.0, 'ETHUSDT': 100.0}] * callers)
+
+    def test_failed_fetch_falls_back_to_last_known_price(self):
+        expired = time.time() - settings.QUOTE_CACHE_TTL - settings.QUOTE_CACHE_STALE_TTL - 1
+        quote_cache.quote_cache().set('quote:BTCUSDT', {'price': 95.5, 'fetched_at': expired}, None)
+
+        def fetch_quotes(symbols, failed=None):
+            self.calls.extend(symbols)
+            failed.update(symbols)
+            return {}
+
+        with mock.patch.object(quote_cache, 'fetch_quotes', fetch_quotes):
+            prices = quote_cache.get_quotes(['BTCUSDT'])
+
+        self.assertEqual(self.calls, ['BTCUSDT'])
+        self.assertEqual(prices, {'BTCUSDT': 95.5})
+
+    def test_quote_without_a_price_is_cached_as_a_miss(self):
+        with mock.patch.object(quote_cache, 'fetch_quotes', return_value={'BTCUSDT': None, 'ETHUSDT': 3000.5}):
+            prices = quote_cache.get_quotes(['BTCUSDT', 'ETHUSDT'])
+
+        self.assertEqual(prices, {'ETHUSDT': 3000.5})
+        self.assertIsNone(quote_cache.quote_cache().get('quote:BTCUSDT')['price'])
+        self.assertEqual(quote_cache.get_quotes(['BTCUSDT', 'ETHUSDT']), {'ETHUSDT': 3000.5})
+
+
+class QuoteClientTests(TestCase):
+
+    @override_settings(FMP_MAX_RETRIES=0, FMP_CIRCUIT_FAILURE_THRESHOLD=1, FMP_CIRCUIT_RESET_TIMEOUT=0)
+    def test_unexpected_error_still_closes_the_probe(self):
+        client = QuoteClient()
+        crashing = mock.Mock(status_code=200, **{'json.side_effect': RuntimeError('decoder crashed')})
+        working = mock.Mock(status_code=200, **{'json.return_value': [{'symbol': 'BTCUSD', 'price': 1.0}]})
+        client.session = mock.Mock(**{'get.side_effect': [requests.ConnectionError('down'), crashing, working]})
+
+        # The first failure opens the circuit, then its probe fails with something unexpected
+        with self.assertRaises(requests.RequestException):
+            client.get_json('https://example.com/quote/BTCUSD')
+        with self.assertRaises(RuntimeError):
+            client.get_json('https://example.com/quote/BTCUSD')
+
+        # The next probe is still let through, and closes the circuit
+        self.assertEqual(client.get_json('https://example.com/quote/BTCUSD'), [{'symbol': 'BTCUSD', 'price': 1.0}])
+        self.assertEqual(client.breaker.state, 'closed')
+
+
+class TradeUpdaterTests(TestCase):
+
+    def test_unquoted_trades_keep_their_price(self):
+        owner = User.objects.create(username='updater')
+        TradeUploadBlofin.objects.bulk_create([
+            make_trade(owner, is_open=True),
+            make_trade(owner, underlying_asset='ETHUSDT', is_open=True),
+        ])
+
+        with mock.patch('upload_csv.exchange.blofin.get_quotes', return_value={'BTCUSDT': 63000.0}):
+            TradeUpdater(owner).update_trade_prices_by_page(owner, page=1)
+            TradeUpdater(owner).update_trade_prices_by_page(owner, page=2)
+
+        prices = dict(TradeUploadBlofin.objects.values_list('underlying_asset', 'price'))
+        self.assertEqual(prices, {'BTCUSDT': Decimal('63000'), 'ETHUSDT': Decimal('62000.5')})
+
+
+class RematchTradesTests(TestCase):
+
+    def test_rebuilt_positions_are_linked(self):
+        owner = User.objects.create(username='rematch')
+        make_trade(owner).save()
+        make_trade(owner, side='Sell', filled_quantity=Decimal('0.2'), original_filled_quantity=Decimal('0.2'),
+                   order_time=datetime(2024, 5, 11, tzinfo=timezone.utc)).save()
+
+        call_command('rematch_trades', '--parallelism', '1', stdout=io.StringIO())
+
+        live_trade = LiveTrades.objects.get(owner=owner, asset='BTCUSDT')
+        self.assertEqual(live_trade.total_quantity, Decimal('0.3'))
+        self.assertEqual(sorted(live_trade.get_trade_ids()),
+                         sorted(TradeUploadBlofin.objects.filter(owner=owner).values_list('id', flat=True)))
+
+
+class LiveTradesViewTests(TestCase):
+
+    def test_positions_count_their_trades_and_list_them_by_page(self):
+        owner = User.objects.create(username='positions-view')
+        live_trade = LiveTrades.objects.create(owner=owner, asset='BTCUSDT', total_quantity=1, is_live=True)
+        trades = [make_trade(owner, fee=Decimal(fee), live_trade=live_trade) for fee in range(1, 13)]
+        TradeUploadBlofin.objects.bulk_create(trades)
+        client = APIClient()
+        client.force_authenticate(owner)
+
+        position = client.get('/live-trades/').json()['results'][0]
+        page = client.get(f'/live-trades/{live_trade.id}/trades/').json()
+
+        self.assertEqual(position['trade_count'], 12)
+        self.assertNotIn('trade_ids', position)
+        self.assertEqual(page['count'], 12)
+        self.assertEqual(len(page['results']), 10)
+
+
+class FmpQuoteTests(TestCase):
+
+    def test_quote_without_a_price_is_left_out(self):
+        quotes = [{'symbol': 'BTCUSD', 'price': None}, {'symbol': 'ETHUSD'}, {'symbol': 'SOLUSD', 'price': 150.25}]
+
+        with mock.patch.object(fmp_api, '_fetch_chunk', return_value=quotes):
+            failed = set()
+            prices = fmp_api.fetch_quotes(['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], failed=failed)
+
+        self.assertEqual(prices, {'SOLUSDT': 150.25})
+        self.assertEqual(failed, set())
+
+
+class PriceSourceTests(TestCase):
+
+    def test_source_without_quotes_fails_when_created(self):
+        class IncompleteSource(PriceSource):
+            pass
+
+        with self.assertRaises(TypeError):
+            IncompleteSource()
+
+
+class FifoMatchingTests(TestCase):
+    """Every FIFO path against match_fifo(), the reference loop."""
+
+    QUANTITIES = ['0.1', '0.25', '0.5', '1', '1.5', '2', '3']
+
+    def setUp(self):
+        self.owner = User.objects.create(username='fifo')
+        self.rng = random.Random(14)
+        self.added = 0
+
+    def random_lots(self, rng, first_id):
+        return [new_lot(first_id + index, Decimal(rng.choice(self.QUANTITIES)))
+                for index in range(rng.randint(0, 10))]
+
+    def test_vectorized_matches_loop(self):
+        for seed in range(500):
+            rng = random.Random(seed)
+            buys, sells = self.random_lots(rng, 0), self.random_lots(rng, 100)
+
+            loop_buys, loop_sells, loop_fills = copy.deepcopy(buys), copy.deepcopy(sells), []
+            match_fifo(loop_buys, loop_sells, loop_fills)
+            vectorized_buys, vectorized_sells, vectorized_fills = copy.deepcopy(buys), copy.deepcopy(sells), []
+            match_fifo_vectorized(vectorized_buys, vectorized_sells, vectorized_fills)
+
+            self.assertEqual((vectorized_buys, vectorized_sells, vectorized_fills),
+                             (loop_buys, loop_sells, loop_fills), seed)
+
+    def add_trades(self, count, start, minutes=30):
+        """Random buys and sells within `minutes` of start, so many share an order time."""
+        for _ in range(count):
+            self.added += 1
+            quantity = Decimal(self.rng.choice(self.QUANTITIES))
+            make_trade(
+                self.owner,
+                order_time=start + timedelta(minutes=self.rng.randint(0, minutes)),
+                side=self.rng.choice(['Buy', 'Buy', 'Sell']),
+                filled_quantity=quantity,
+                original_filled_quantity=quantity,
+                fee=Decimal(self.added),
+            ).save()
+
+    def expected(self):
+        """Trade states and fills from matching the whole history with the loop."""
+        trades = list(TradeUploadBlofin.objects.filter(owner=self.owner).order_by('order_time', 'id'))
+        buys = [new_lot(trade.id, trade.original_filled_quantity) for trade in trades if trade.side == 'Buy']
+        sells = [new_lot(trade.id, trade.original_filled_quantity) for trade in trades if trade.side == 'Sell']
+        fills = []
+        match_fifo(buys, sells, fills)
+        states = {lot['id']: (lot['is_matched'], lot['is_partially_matched'], lot['is_open'], lot['value'])
+                  for lot in buys + sells}
+        open_quantity = sum((lot['value'] for lot in buys if lot['is_open']), Decimal(0))
+        return states, sorted(fills), open_quantity
+
+    def matched(self, open_quantity):
+        states = {trade.id: (trade.is_matched, trade.is_partially_matched, trade.is_open, trade.filled_quantity)
+                  for trade in TradeUploadBlofin.objects.filter(owner=self.owner)}
+        fills = sorted(TradeMatch.objects.filter(owner=self.owner).values_list(
+            'buy_trade_id', 'sell_trade_id', 'quantity'))
+        return states, fills, open_quantity
+
+    def test_bulk_matching_matches_loop(self):
+        self.add_trades(150, datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+        open_quantity = TradeMatcherProcessor(self.owner).process_assets('BTCUSDT')
+
+        self.assertEqual(self.matched(open_quantity), self.expected())
+
+    def test_checkpoint_resume_matches_loop(self):
+        processor = TradeMatcherProcessor(self.owner)
+        self.add_trades(80, datetime(2024, 5, 1, tzinfo=timezone.utc))
+        processor.process_assets('BTCUSDT')
+
+        # Trades at the checkpoint's own order time come after it by id
+        checkpoint = MatcherCheckpoint.objects.get(owner=self.owner, asset='BTCUSDT')
+        self.add_trades(5, checkpoint.last_order_time, minutes=0)
+        self.add_trades(60, datetime(2024, 5, 2, tzinfo=timezone.utc))
+        with mock.patch.object(processor, 'rebuild_asset', wraps=processor.rebuild_asset) as rebuild:
+            open_quantity = processor.process_assets('BTCUSDT')
+        rebuild.assert_not_called()
+        self.assertEqual(self.matched(open_quantity), self.expected())
+
+        # A back-dated trade makes the checkpoint stale
+        self.add_trades(10, datetime(2024, 5, 1, tzinfo=timezone.utc))
+        with mock.patch.object(processor, 'rebuild_asset', wraps=processor.rebuild_asset) as rebuild:
+            open_quantity = processor.process_assets('BTCUSDT')
+        rebuild.assert_called_once_with('BTCUSDT')
+        self.assertEqual(self.matched(open_quantity), self.expected())
+
+    def test_short_opens_with_its_sell(self):
+        opened_at = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        closed_at = datetime(2024, 5, 3, tzinfo=timezone.utc)
+        make_trade(self.owner, side='Sell', order_time=opened_at, avg_fill=Decimal('100')).save()
+        make_trade(self.owner, side='Buy', order_time=closed_at, avg_fill=Decimal('90')).save()
+
+        TradeMatcherProcessor(self.owner).process_assets('BTCUSDT')
+
+        match = TradeMatch.objects.get(owner=self.owner)
+        self.assertEqual((match.opened_at, match.closed_at), (opened_at, closed_at))
+        self.assertEqual((match.entry_price, match.exit_price), (Decimal('100'), Decimal('90')))
+        self.assertEqual(match.realized_pnl, Decimal('5'))
+        self.assertEqual(match.holding_period, timedelta(days=2))
@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import UploadFileView, CsvTradeView, LiveTradesListView, LiveTradesUpdateView, DeleteAllTradesAndLiveTradesView
+from .views import UploadFileView, UploadJobDetailView, CsvTradeView, LiveTradesListView, LiveTradeTradesListView, LiveTradesUpdateView, DeleteAllTradesAndLiveTradesView, TradeHistoryListView, RealizedPnlView, QuoteCacheStatsView, QuoteClientStatsView
 urlpatterns = [
     path('upload/', UploadFileView.as_view(), name='upload-file'),
+    path('upload-jobs/<int:pk>/', UploadJobDetailView.as_view(), name='upload-job-detail'),
     path('trades-csv/', CsvTradeView.as_view(), name='csv-trade'),
+    path('trade-history/', TradeHistoryListView.as_view(), name='trade-history'),
+    path('realized-pnl/', RealizedPnlView.as_view(), name='realized-pnl'),
     path('live-trades/', LiveTradesListView.as_view(), name='live_trades_list'),
     path('live-trades/<int:pk>/', LiveTradesUpdateView.as_view(), name='live-trades-update'),
+    path('live-trades/<int:pk>/trades/', LiveTradeTradesListView.as_view(), name='live-trade-trades'),
+    path('quote-cache-stats/', QuoteCacheStatsView.as_view(), name='quote-cache-stats'),
+    path('quote-client-stats/', QuoteClientStatsView.as_view(), name='quote-client-stats'),
     path('delete-trades/', DeleteAllTradesAndLiveTradesView.as_view(), name='delete-all-trades-and-live-trades'),
 ]
@@ -1,5 +1,6 @@
-from upload_csv.utils.convert_to_decimal import convert_to_decimal
-from upload_csv.utils.convert_to_native_datetime import convert_to_naive_datetime
-from upload_csv.utils.convert_to_boolean import convert_to_boolean
+from upload_csv.utils.convert_to_decimal import convert_to_decimal, convert_column_to_decimal
+from upload_csv.utils.convert_to_native_datetime import convert_to_naive_datetime, convert_column_to_naive_datetime
+from upload_csv.utils.convert_to_boolean import convert_to_boolean, convert_column_to_boolean
 from upload_csv.utils.process_invalid_data import process_invalid_data
 from upload_csv.utils.convert_fields_to_readable import FormattingUtils
+from upload_csv.utils.trade_fingerprint import build_trade_fingerprint
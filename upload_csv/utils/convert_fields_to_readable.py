@@ -19,11 +19,22 @@ class FormattingUtils:
             return 2
 
     @staticmethod
-    def formatted_value(value, decimal_places=None, default='N/A'):
-        """Format a value with conditional decimal places."""
+    def get_asset_decimal_places(asset):
+        """Return the registered tick precision for an asset, if any."""
+        # Imported here as the registry depends on the models, which use utils
+        from upload_csv.registry.symbol_registry import get_symbol
+
+        info = get_symbol(asset) if asset else None
+        return info.tick_precision if info else None
+
+    @staticmethod
+    def formatted_value(value, decimal_places=None, default='N/A', asset=None):
+        """Format a value with the asset's tick precision or conditional decimal places."""
         if value is not None:
-            decimal_places = decimal_places or FormattingUtils.get_decimal_places(
-                Decimal(value))
+            if decimal_places is None and asset:
+                decimal_places = FormattingUtils.get_asset_decimal_places(asset)
+            if decimal_places is None:
+                decimal_places = FormattingUtils.get_decimal_places(Decimal(value))
             return f"{Decimal(value):.{decimal_places}f}"
         return default
 
@@ -60,7 +71,7 @@ class FormattingUtils:
         return f"{Decimal(percentage):.2f}%" if percentage is not None else default
 
     @staticmethod
-    def formatted_price(price, avg_fill, is_open, default='N/A'):
+    def formatted_price(price, avg_fill, is_open, default='N/A', asset=None):
         """Show price based on is_open status and automatic decimal places."""
         if avg_fill == price:
             return '--'
@@ -68,7 +79,7 @@ class FormattingUtils:
         if not is_open and price == Decimal('0.0'):
             return '--'
 
-        return FormattingUtils.formatted_value(price) if price is not None else default
+        return FormattingUtils.formatted_value(price, asset=asset) if price is not None else default
 
     @staticmethod
     def format_asset_name(asset_name):
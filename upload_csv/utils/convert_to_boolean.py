@@ -6,3 +6,9 @@ def convert_to_boolean(value):
     """Convert value to Boolean."""
     bool_map = {"Y": True, "N": False}
     return bool_map.get(value, None)
+
+
+def convert_column_to_boolean(column):
+    """Convert a whole pandas column of Y/N values to Booleans."""
+    bool_map = {"Y": True, "N": False}
+    return column.map(bool_map)
@@ -5,6 +5,7 @@ from django.conf import settings
 import re
 import logging
 from datetime import datetime
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -46,3 +47,23 @@ def convert_to_decimal(value):
         return Decimal(value)
     except (ValueError, InvalidOperation):
         return Decimal('0.0')
+
+
+def convert_column_to_decimal(column):
+    """Convert a whole pandas column to Decimals, handle special cases."""
+    if pd.api.types.is_numeric_dtype(column):
+        # Already numeric, only the blanks need the dummy value
+        return column.fillna(0).astype(str).map(Decimal)
+
+    values = column.astype(str).str.strip()
+    negative = values.str.startswith('-')
+
+    # Remove any non-numeric characters (except decimal point)
+    numeric = values.str.replace(r'[^\d\.]', '', regex=True)
+
+    # 'Market', '--', blanks and anything unparseable get the dummy value
+    valid = numeric.str.fullmatch(r'\d+\.?\d*|\.\d+')
+    numeric = numeric.where(valid, '0.0')
+    numeric = numeric.where(~(negative & valid), '-' + numeric)
+
+    return numeric.map(Decimal)
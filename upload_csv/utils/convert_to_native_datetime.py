@@ -5,6 +5,7 @@ from django.conf import settings
 import re
 import logging
 from datetime import datetime
+import pandas as pd
 
 
 def convert_to_naive_datetime(date_str, date_format='%m/%d/%Y %H:%M:%S'):
@@ -20,3 +21,14 @@ def convert_to_naive_datetime(date_str, date_format='%m/%d/%Y %H:%M:%S'):
     except ValueError:
         # Log or handle the error if needed
         return None
+
+
+def convert_column_to_naive_datetime(column, date_format='%m/%d/%Y %H:%M:%S'):
+    """
+    Convert a pandas column of strings to naive datetimes in one pass.
+
+    :param column: The pandas Series holding the date strings.
+    :param date_format: The format of the date strings (default: '%m/%d/%Y %H:%M:%S').
+    :return: A datetime64 Series, with NaT wherever conversion fails.
+    """
+    return pd.to_datetime(column, format=date_format, errors='coerce')
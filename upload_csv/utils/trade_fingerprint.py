@@ -0,0 +1,30 @@
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import timezone
+import hashlib
+
+# Fills closer than the old duplicate tolerance round to the same value
+AVG_FILL_PRECISION = Decimal('0.0001')
+FEE_PRECISION = Decimal('0.0000000001')
+
+
+def build_trade_fingerprint(owner_id, order_time, underlying_asset, side, fee, avg_fill):
+    """
+    Build the normalized fingerprint identifying a trade for an owner.
+
+    :param owner_id: The id of the user owning the trade.
+    :param order_time: The aware datetime of the order.
+    :param underlying_asset: The exchange symbol, e.g. 'BTCUSDT'.
+    :param side: 'Buy' or 'Sell'.
+    :param fee: The fee as a Decimal.
+    :param avg_fill: The average fill price as a Decimal.
+    :return: A 64 character hex digest.
+    """
+    key = '|'.join([
+        str(owner_id),
+        order_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+        underlying_asset,
+        side,
+        format(Decimal(fee).quantize(FEE_PRECISION, rounding=ROUND_HALF_UP), 'f'),
+        format(Decimal(avg_fill).quantize(AVG_FILL_PRECISION, rounding=ROUND_HALF_UP), 'f'),
+    ])
+    return hashlib.sha256(key.encode()).hexdigest()
@@ -1,19 +1,25 @@
-from django.shortcuts import render
-from rest_framework.permissions import IsAuthenticated
-from rest_framework import generics, filters
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework import generics, filters, serializers
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-import logging
-import pandas as pd
+from django.http import Http404
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import TradeUploadBlofin, LiveTrades
-from .serializers import FileUploadSerializer, SaveTradeSerializer, LiveTradesSerializer, LiveFillSerializer
-from upload_csv.exchange.blofin import BloFinHandler, CsvProcessor, TradeUpdater
-from upload_csv.exchange.live_price_updater import LiveTradeUpdater
-from upload_csv.utils.process_invalid_data import process_invalid_data
-from upload_csv.exchange.blofin_trade_matcher import TradeIdMatcher
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from django.db.models import Sum, Count
+from decimal import Decimal
+from .models import TradeUploadBlofin, LiveTrades, UploadJob, UploadWatermark, MatcherCheckpoint, TradeMatch
+from .serializers import FileUploadSerializer, SaveTradeSerializer, LiveTradesSerializer, LiveFillSerializer, UploadJobSerializer, TradeMatchSerializer
+from upload_csv.exchange.blofin import REQUIRED_COLUMNS, read_csv_header
+from upload_csv.jobs.upload_job_runner import enqueue_upload_job
+from upload_csv.api_handler.quote_cache import quote_cache_stats, reset_quote_cache_stats
+from upload_csv.api_handler.quote_client import get_quote_client
+from pnls.profit_refresh import schedule_realized_profit_refresh
+import hashlib
+import tempfile
 import time
+import os
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,10 +40,18 @@ class DeleteAllTradesAndLiveTradesView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
 
     def delete(self, request, *args, **kwargs):
+        # Realized PnL emitted from the ledger goes with the trades
+        pnl_user_ids = list(TradeMatch.objects.values_list('owner_id', flat=True).distinct())
         # Delete all trades
         trade_count, _ = TradeUploadBlofin.objects.all().delete()
         # Delete all live trades
         live_trade_count, _ = LiveTrades.objects.all().delete()
+        # Forget previous uploads so the same files can be imported again
+        UploadJob.objects.all().delete()
+        UploadWatermark.objects.all().delete()
+        MatcherCheckpoint.objects.all().delete()
+        for user_id in pnl_user_ids:
+            schedule_realized_profit_refresh(user_id)
 
         return Response({
             "message": f"{trade_count} trades and {live_trade_count} live trades deleted."
@@ -45,7 +59,8 @@ class DeleteAllTradesAndLiveTradesView(generics.DestroyAPIView):
 
 
 class UploadFileView(generics.CreateAPIView):
-    # permission_classes = [IsAuthenticated]
+    # Upload jobs are owned by, and reported back to, request.user
+    permission_classes = [IsAuthenticated]
     serializer_class = FileUploadSerializer
     http_method_names = ['post', 'options', 'head']
 
@@ -69,6 +84,7 @@ class UploadFileView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         file = serializer.validated_data['file']
         exchange = serializer.validated_data.get('exchange', None)
+        full_resync = serializer.validated_data.get('full_resync', False)
 
         logger.debug(f"Exchange value: {exchange}")
 
@@ -77,60 +93,168 @@ class UploadFileView(generics.CreateAPIView):
             return Response({"error": "Sorry, under construction."}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            reader = pd.read_csv(file)
-            logger.debug(f"CSV file read successfully. Number of rows: {len(reader)}")
+            columns = read_csv_header(file)
+            logger.debug(f"CSV header read successfully. Columns: {columns}")
         except Exception as e:
             logger.error(f"Error reading CSV file: {str(e)}")
             return Response({"error": "Error reading CSV file."}, status=status.HTTP_400_BAD_REQUEST)
 
-        required_columns = {'Underlying Asset', 'Margin Mode', 'Leverage', 'Order Time', 'Side', 'Avg Fill',
-                            'Price', 'Filled', 'Total', 'PNL', 'PNL%', 'Fee', 'Order Options', 'Reduce-only', 'Status'}
-        missing_cols = required_columns - set(reader.columns)
+        missing_cols = REQUIRED_COLUMNS - columns
         if missing_cols:
             logger.warning(f"Missing columns: {', '.join(missing_cols)}")
             return Response({"error": f"Missing Columns: {', '.join(missing_cols)}"})
 
-        unexpected_cols = set(reader.columns) - required_columns
+        unexpected_cols = columns - REQUIRED_COLUMNS
         if unexpected_cols:
             logger.warning(f"Unexpected columns found: {', '.join(unexpected_cols)}")
             return Response({"error": f"Unexpected columns found: {', '.join(unexpected_cols)}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        csv_data = reader.to_dict('records')
-        logger.debug(f"CSV data converted to list of dictionaries. Number of records: {len(csv_data)}")
-
-        handler = BloFinHandler()
-        # matcher_id = TradeIdMatcher(owner)
-        processor = CsvProcessor(handler)
-        trade_updater = TradeUpdater(owner)
-
-        logger.debug(f"Starting CSV processing.")
-        new_trades_count, duplicates, canceled_count = processor.process_csv_data(
-            csv_data, owner, exchange)
-        logger.debug(f"CSV processing complete. New trades count: {new_trades_count}, Duplicates: {duplicates}, Canceled count: {canceled_count}")
-
-        live_price_fetches_count = trade_updater.count_open_trades_for_price_fetch()
-        logger.debug(f"Live price fetches count: {live_price_fetches_count}")
-
-        if new_trades_count > 0:
-            # matcher_id.check_trade_ids()
-            # trade_updater.update_trade_prices_on_upload()
-            print("test")
-        else:
-            logger.info("No new trades added. Skipping matching process.")
+        # Copy the upload to local disk so the worker can read it after the request ends,
+        # fingerprinting it on the way through
+        file_hash = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as temp_file:
+            for chunk in file.chunks():
+                file_hash.update(chunk)
+                temp_file.write(chunk)
+        file_hash = file_hash.hexdigest()
+
+        previous_job = UploadJob.objects.filter(
+            owner=owner, exchange=exchange, file_hash=file_hash, status='completed'
+        ).order_by('created_at').first()
+
+        if previous_job and not full_resync:
+            os.remove(temp_file.name)
+            job = UploadJob.objects.create(
+                owner=owner,
+                exchange=exchange,
+                file_name=file.name,
+                file_hash=file_hash,
+                duplicate_of=previous_job,
+                status='completed',
+                rows_parsed=previous_job.rows_parsed,
+                duplicates_count=previous_job.rows_parsed - previous_job.canceled_count,
+                canceled_count=previous_job.canceled_count,
+                finished_at=timezone.now(),
+            )
+            logger.info(f"Upload is identical to job {previous_job.id}. Skipping processing.")
+
+            response_message = {
+                "status": "success",
+                "job_id": job.id,
+                "message": f"This file was already uploaded. 0 new trades added, {job.duplicates_count} duplicates found,  {job.canceled_count} canceled trades ignored. ",
+            }
+            return Response(response_message, status=status.HTTP_200_OK)
+
+        job = UploadJob.objects.create(
+            owner=owner, exchange=exchange, file_name=file.name,
+            file_hash=file_hash, full_resync=full_resync)
+        try:
+            enqueue_upload_job(job, temp_file.name)
+        except Exception:
+            return Response({"error": "The upload could not be queued, please try again.", "job_id": job.id},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
         end_time = time.time()  # End timing
         elapsed_time = end_time - start_time  # Calculate the elapsed time
-        logger.debug(f"CSV upload and processing took {elapsed_time:.2f} seconds.")
-
+        logger.debug(f"CSV upload queued as job {job.id} in {elapsed_time:.2f} seconds.")
 
         response_message = {
-            "status": "success",
-            "message": f"{new_trades_count} new trades added, {duplicates} duplicates found,  {canceled_count} canceled trades ignored. ",
-            "time_taken": f"{elapsed_time:.2f} seconds" 
+            "status": "accepted",
+            "job_id": job.id,
+            "status_url": reverse('upload-job-detail', kwargs={'pk': job.id}),
+            "time_taken": f"{elapsed_time:.2f} seconds"
         }
 
         logger.debug(f"Response message: {response_message}")
-        return Response(response_message, status=status.HTTP_201_CREATED)
+        return Response(response_message, status=status.HTTP_202_ACCEPTED)
+
+
+class UploadJobDetailView(generics.RetrieveAPIView):
+    """
+    API view reporting the progress counters and stage timings of an upload job.
+    """
+    serializer_class = UploadJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return UploadJob.objects.filter(owner=self.request.user)
+
+
+class TradeHistoryListView(generics.ListAPIView):
+    """
+    API view listing the user's closed lots from the match ledger, newest first.
+    """
+    serializer_class = TradeMatchSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['asset']
+    ordering_fields = ['closed_at', 'opened_at', 'realized_pnl', 'quantity']
+    ordering = ['-closed_at']
+
+    def get_queryset(self):
+        return TradeMatch.objects.filter(owner=self.request.user)
+
+
+class RealizedPnlView(generics.GenericAPIView):
+    """
+    API view totalling realized PnL per asset from the match ledger.
+
+    Optional `asset`, `start` and `end` (ISO dates) query parameters limit
+    the lots counted by asset and close time.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        matches = TradeMatch.objects.filter(owner=request.user)
+
+        asset = request.query_params.get('asset')
+        if asset:
+            matches = matches.filter(asset=asset)
+
+        for param, lookup in (('start', 'closed_at__date__gte'), ('end', 'closed_at__date__lte')):
+            value = request.query_params.get(param)
+            if value:
+                date = parse_date(value)
+                if date is None:
+                    return Response({"error": f"Invalid {param} date."}, status=status.HTTP_400_BAD_REQUEST)
+                matches = matches.filter(**{lookup: date})
+
+        assets = list(matches.order_by('asset').values('asset').annotate(
+            realized_pnl=Sum('realized_pnl'),
+            quantity=Sum('quantity'),
+            matches=Count('id'),
+        ))
+        return Response({
+            "total_realized_pnl": sum((row['realized_pnl'] for row in assets), Decimal('0')),
+            "assets": assets,
+        }, status=status.HTTP_200_OK)
+
+
+class QuoteCacheStatsView(generics.GenericAPIView):
+    """
+    API view reporting the shared quote cache's hit and miss counters.
+
+    DELETE resets them, to measure a new TTL setting from a clean start.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(quote_cache_stats(), status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        reset_quote_cache_stats()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class QuoteClientStatsView(generics.GenericAPIView):
+    """
+    API view reporting the quote client's call counters, circuit state and
+    latency histogram. They are kept per process; `pid` says which.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(get_quote_client().stats(), status=status.HTTP_200_OK)
 
 
 class LiveTradesListView(generics.ListAPIView):
@@ -139,12 +263,39 @@ class LiveTradesListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated] 
 
     def get_queryset(self):
+        # Prices are kept fresh by the poll_live_prices worker, not per request
         owner = self.request.user
-        live_price_updater = LiveTradeUpdater()
-        live_price_updater.update_live_prices_for_live_trades()
-        return LiveTrades.objects.filter(owner=owner)
+        return LiveTrades.objects.filter(owner=owner).annotate(trade_count=Count('trades'))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        live_trades = page if page is not None else list(queryset)
+        serializer = self.get_serializer(live_trades, many=True)
+
+        # The oldest price shown, so clients can tell how stale the page is
+        refreshed = [live_trade.price_updated_at for live_trade in live_trades if live_trade.price_updated_at]
+        prices_as_of = serializers.DateTimeField().to_representation(min(refreshed)) if refreshed else None
+
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+            response.data['prices_as_of'] = prices_as_of
+            return response
+        return Response({'prices_as_of': prices_as_of, 'results': serializer.data})
 
 
+class LiveTradeTradesListView(generics.ListAPIView):
+    """
+    API view listing the trades linked to one of the user's positions, newest first.
+    """
+    serializer_class = SaveTradeSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return TradeUploadBlofin.objects.filter(
+            owner=self.request.user, live_trade_id=self.kwargs['pk']
+        ).order_by('-order_time', '-id')
+
     
 class LiveTradesUpdateView(generics.UpdateAPIView):
     """